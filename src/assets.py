@@ -0,0 +1,318 @@
+"""
+Loads images and sounds in the background, so the window can show something while the game's assets load.
+
+Modules ask the asset manager for a handle (an Asset) when they're imported, which doesn't touch the disk.
+Files are read and decoded on a thread pool once they're requested; anything that needs the display, like
+convert_alpha and scaling, happens on the main thread in AssetManager.update or the first time get() is called.
+If a handle is used before it was requested, get() just loads it right away.
+
+On the web there are no threads, so requested assets are loaded one by one in update instead, a few
+milliseconds per frame. They're read from the bundles web_prep packs them into; see bundles.py.
+
+Images and sounds can also be baked ahead of time with tools/bake_assets.py: images are written to
+assets/baked as raw pixels, already cut and scaled, and sounds as raw samples in the mixer's format. Baked
+files are named after a hash of the source file and everything that affects the result. If a baked file
+matches, it's used instead of decoding the asset; otherwise it's loaded as usual, so a stale or missing
+cache only costs time.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import mmap
+import struct
+import time
+from typing import Any, Callable, Generic, Iterable, Optional, TypeVar
+
+import pygame
+
+from bundles import open_asset
+from constants import ASSET_LOAD_BUDGET, ASSET_LOADER_THREADS, ITEM_SLOT_ITEM_SIZE, TILE_SIZE
+from utils import get_asset, is_web
+
+T = TypeVar("T")
+
+# Bump this whenever the way assets are prepared changes, so older baked files are ignored
+BAKE_VERSION = 1
+
+def get_baked_path(digest: str, extension: str) -> str:
+    return get_asset("baked", f"{digest}.{extension}")
+
+def map_file(path: str) -> Optional[mmap.mmap]:
+    try:
+        with open(path, "rb") as file:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+class Baker:
+    """Writes an asset to the baked cache and reads it back."""
+    extension: str
+
+    def get_parameters(self) -> str:
+        """Everything besides the source file that affects the baked result."""
+        return ""
+
+    def get_path(self, key: str, source: str) -> str:
+        with open(source, "rb") as file:
+            digest = hashlib.sha1(file.read())
+        digest.update(f"{key}|{self.get_parameters()}|{BAKE_VERSION}".encode())
+        return get_baked_path(digest.hexdigest(), self.extension)
+
+    def write(self, path: str, value: Any):
+        pass
+
+    def read(self, path: str) -> Optional[Any]:
+        """Runs on a worker thread. Returns None if the file is missing or invalid."""
+        return None
+
+    def finish(self, baked: Any) -> Any:
+        """Runs on the main thread with the result of read."""
+        return baked
+
+class Baked:
+    """What a baker read, so Asset.get knows to finish it with the baker instead."""
+    value: Any
+
+    def __init__(self, value: Any):
+        self.value = value
+
+IMAGE_MAGIC = b"FGBK"
+# magic, version, number of surfaces, whether the asset is a list of surfaces; then each surface's size
+IMAGE_HEADER = struct.Struct("<4sHHB")
+IMAGE_SIZE = struct.Struct("<HH")
+
+class ImageBaker(Baker):
+    """Surfaces or lists of surfaces, stored as raw BGRA pixels."""
+    extension = "rgba"
+
+    def get_parameters(self) -> str:
+        return f"{TILE_SIZE}|{ITEM_SLOT_ITEM_SIZE}"
+
+    def write(self, path: str, value: pygame.Surface | list[pygame.Surface]):
+        surfaces = value if isinstance(value, list) else [value]
+        with open(path, "wb") as file:
+            file.write(IMAGE_HEADER.pack(IMAGE_MAGIC, BAKE_VERSION, len(surfaces), isinstance(value, list)))
+            for surface in surfaces:
+                file.write(IMAGE_SIZE.pack(*surface.get_size()))
+            for surface in surfaces:
+                file.write(pygame.image.tobytes(surface, "BGRA"))
+
+    def read(self, path: str) -> Optional[tuple[list[pygame.Surface], bool]]:
+        # The surfaces point straight into the mapped file, so it's only copied once, by convert_alpha
+        data = map_file(path)
+        if data is None or len(data) < IMAGE_HEADER.size:
+            return None
+        magic, version, count, is_list = IMAGE_HEADER.unpack_from(data)
+        if magic != IMAGE_MAGIC or version != BAKE_VERSION:
+            return None
+        sizes = [IMAGE_SIZE.unpack_from(data, IMAGE_HEADER.size + i * IMAGE_SIZE.size) for i in range(count)]
+        if len(data) != IMAGE_HEADER.size + count * IMAGE_SIZE.size + sum(width * height * 4 for width, height in sizes):
+            return None
+
+        pixels = memoryview(data)
+        offset = IMAGE_HEADER.size + count * IMAGE_SIZE.size
+        surfaces = []
+        for width, height in sizes:
+            length = width * height * 4
+            surfaces.append(pygame.image.frombuffer(pixels[offset:offset + length], (width, height), "BGRA"))
+            offset += length
+        return surfaces, bool(is_list)
+
+    def finish(self, baked: tuple[list[pygame.Surface], bool]) -> pygame.Surface | list[pygame.Surface]:
+        surfaces, is_list = baked
+        surfaces = [surface.convert_alpha() for surface in surfaces]
+        return surfaces if is_list else surfaces[0]
+
+SOUND_MAGIC = b"FGBS"
+# magic, version, then the mixer's frequency, sample format and channels the samples are in
+SOUND_HEADER = struct.Struct("<4sHihH")
+
+class SoundBaker(Baker):
+    """
+    Sounds, stored as raw samples in the format the mixer was opened with. Loading those is just a copy,
+    where a WAV has to be decoded and converted to the mixer's sample rate and format.
+    """
+    extension = "pcm"
+
+    def get_parameters(self) -> str:
+        return str(pygame.mixer.get_init())
+
+    def write(self, path: str, value: pygame.mixer.Sound):
+        with open(path, "wb") as file:
+            file.write(SOUND_HEADER.pack(SOUND_MAGIC, BAKE_VERSION, *pygame.mixer.get_init()))
+            file.write(value.get_raw())
+
+    def read(self, path: str) -> Optional[pygame.mixer.Sound]:
+        data = map_file(path)
+        if data is None or len(data) < SOUND_HEADER.size:
+            return None
+        magic, version, *mixer_format = SOUND_HEADER.unpack_from(data)
+        if magic != SOUND_MAGIC or version != BAKE_VERSION or tuple(mixer_format) != pygame.mixer.get_init():
+            return None
+        return pygame.mixer.Sound(buffer=memoryview(data)[SOUND_HEADER.size:])
+
+image_baker = ImageBaker()
+sound_baker = SoundBaker()
+
+class Asset(Generic[T]):
+    """A handle to an asset that may not be loaded yet."""
+    key: str
+    # Runs on a worker thread, so it must not touch the display
+    decode: Callable[[], Any]
+    # Runs on the main thread with the result of decode
+    finish: Callable[[Any], T]
+    # For assets that can be baked, the file they're made from and how they're baked
+    source: Optional[str]
+    baker: Optional[Baker]
+    # If false, it's only loaded once it's used, not when everything is requested
+    preload: bool
+
+    future: Optional[Future] = None
+    value: Optional[T] = None
+
+    def __init__(self, key: str, decode: Callable[[], Any], finish: Callable[[Any], T], source: Optional[str] = None, baker: Optional[Baker] = None, preload: bool = True):
+        self.key = key
+        self.decode = decode
+        self.finish = finish
+        self.source = source
+        self.baker = baker
+        self.preload = preload
+
+    def decode_or_read_baked(self) -> Any:
+        if self.baker is not None:
+            baked = self.baker.read(self.baker.get_path(self.key, self.source))
+            if baked is not None:
+                return Baked(baked)
+        return self.decode()
+
+    def load_live(self) -> T:
+        """Loads the asset without using the baked cache."""
+        return self.finish(self.decode())
+
+    def is_requested(self) -> bool:
+        return self.future is not None or self.value is not None
+
+    def is_decoded(self) -> bool:
+        return self.value is not None or (self.future is not None and self.future.done())
+
+    def is_loaded(self) -> bool:
+        return self.value is not None
+
+    def get(self) -> T:
+        """Returns the asset, waiting for it (or loading it right now) if it isn't loaded yet."""
+        if self.value is None:
+            decoded = self.future.result() if self.future is not None else self.decode_or_read_baked()
+            if isinstance(decoded, Baked):
+                self.value = self.baker.finish(decoded.value)
+            else:
+                self.value = self.finish(decoded)
+            self.future = None
+        return self.value
+
+    def unload(self):
+        """Drops the loaded asset; it's loaded again the next time it's used."""
+        self.value = None
+        self.future = None
+
+def scale_image(image: pygame.Surface, size: Optional[tuple[int, int]], scale: Optional[int]) -> pygame.Surface:
+    image = image.convert_alpha()
+    if scale is not None:
+        size = (image.get_width() * scale, image.get_height() * scale)
+    if size is not None:
+        image = pygame.transform.scale(image, size)
+    return image
+
+class AssetManager:
+    assets: dict[str, Asset]
+    # Requested assets that haven't been finished yet
+    pending: list[Asset]
+    requested_count: int = 0
+    executor: Optional[ThreadPoolExecutor]
+
+    def __init__(self, threads: int):
+        self.assets = {}
+        self.pending = []
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="asset-loader") if threads > 0 else None
+
+    def load(self, key: str, decode: Callable[[], Any], finish: Callable[[Any], T] = lambda value: value,
+             source: Optional[str] = None, baker: Optional[Baker] = None, preload: bool = True) -> Asset[T]:
+        """
+        Returns the handle for key, creating it if it doesn't exist yet. Nothing is loaded until it's requested or used.
+        If a baker is given, the asset must be made only from the source file, so it can be baked.
+        """
+        if is_web():
+            # The baked cache isn't shipped to the web, and the sources are inside bundles there
+            baker = None
+        asset = self.assets.get(key)
+        if asset is None:
+            asset = self.assets[key] = Asset(key, decode, finish, source, baker, preload)
+        return asset
+
+    def image(self, *path: str, size: Optional[tuple[int, int]] = None, scale: Optional[int] = None) -> Asset[pygame.Surface]:
+        """An image from the assets folder, optionally scaled to a size or by an integer factor."""
+        file = get_asset(*path)
+        return self.load(
+            f"image:{file}:{size}:{scale}",
+            lambda: pygame.image.load(open_asset(file), file),
+            lambda image: scale_image(image, size, scale),
+            file,
+            image_baker
+        )
+
+    def sound(self, *path: str) -> Asset[pygame.mixer.Sound]:
+        """A sound from the assets folder. Sounds aren't preloaded; see SoundCache in audio.py."""
+        file = get_asset(*path)
+        return self.load(f"sound:{file}", lambda: pygame.mixer.Sound(file=open_asset(file)), source=file, baker=sound_baker, preload=False)
+
+    def request(self, assets: Iterable[Asset]):
+        """Starts loading the given assets in the background."""
+        for asset in assets:
+            if asset.is_requested():
+                continue
+            if self.executor is not None:
+                asset.future = self.executor.submit(asset.decode_or_read_baked)
+            self.pending.append(asset)
+            self.requested_count += 1
+
+    def request_all(self):
+        self.request([asset for asset in self.assets.values() if asset.preload])
+
+    def load_all(self):
+        """Loads every preloaded asset right now, e.g. when loading times mustn't affect what happens in the game."""
+        for asset in list(self.assets.values()):
+            if asset.preload:
+                asset.get()
+        self.pending.clear()
+
+    def update(self):
+        """Finishes loading requested assets on the main thread, spending at most ASSET_LOAD_BUDGET per frame."""
+        if not self.pending:
+            return
+
+        deadline = time.perf_counter() + ASSET_LOAD_BUDGET / 1000
+        still_pending = []
+        for asset in self.pending:
+            # Unloaded before it finished, e.g. a music track that isn't going to play after all
+            if asset.is_loaded() or not asset.is_requested():
+                continue
+            # Without worker threads, get() decodes it here as well
+            if time.perf_counter() < deadline and (self.executor is None or asset.is_decoded()):
+                asset.get()
+            else:
+                still_pending.append(asset)
+        self.pending = still_pending
+
+    def is_done(self) -> bool:
+        return len(self.pending) == 0
+
+    def get_progress(self) -> float:
+        """Returns how much of what was requested has loaded, from 0 to 1."""
+        if self.requested_count == 0:
+            return 1
+        return 1 - len(self.pending) / self.requested_count
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+asset_manager = AssetManager(0 if is_web() else ASSET_LOADER_THREADS)
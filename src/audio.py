@@ -1,11 +1,94 @@
+from collections import OrderedDict, deque
 from enum import Enum
+import heapq
 import random
-from typing import Self
+from typing import Optional, Self
 
 import pygame
 
+from assets import Asset, asset_manager
+from bundles import open_asset
+from constants import MUSIC_CROSSFADE, SOUND_CACHE_BUDGET, SOUND_CHANNELS, SOUND_DEDUP_WINDOW, SOUND_VOICE_LIMIT
+import sim_clock
 from utils import get_asset
 
+# Which variant of a sound plays shouldn't affect the simulation's random numbers
+sound_random = random.Random()
+
+def get_sound_bytes(sound: pygame.mixer.Sound) -> int:
+    frequency, sample_format, channels = pygame.mixer.get_init()
+    return round(sound.get_length() * frequency) * channels * (abs(sample_format) // 8)
+
+class SoundCache:
+    """
+    Loaded sounds, kept under a byte budget by unloading the least recently played ones.
+    Unloaded sounds are loaded again (from the baked cache, if it's there) the next time they're played.
+    Music tracks count toward the budget too, but they're pinned: only the sounds make room for them.
+    """
+    budget_bytes: int
+    used_bytes: int = 0
+
+    entries: OrderedDict[str, tuple[Asset[pygame.mixer.Sound], int]]
+    # The size of each pinned sound
+    pinned: dict[str, int]
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self.entries = OrderedDict()
+        self.pinned = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, asset: Asset[pygame.mixer.Sound]) -> pygame.mixer.Sound:
+        if asset.key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(asset.key)
+            return asset.get()
+
+        self.misses += 1
+        sound = asset.get()
+        size = get_sound_bytes(sound)
+        self.entries[asset.key] = (asset, size)
+        self.used_bytes += size
+        self.evict()
+        return sound
+
+    def pin(self, asset: Asset[pygame.mixer.Sound]):
+        """Counts a loaded sound toward the budget without ever unloading it, until it's released."""
+        if asset.key in self.pinned:
+            return
+        size = get_sound_bytes(asset.get())
+        self.pinned[asset.key] = size
+        self.used_bytes += size
+        self.evict()
+
+    def release(self, asset: Asset[pygame.mixer.Sound]):
+        """Unloads a pinned sound."""
+        size = self.pinned.pop(asset.key, None)
+        if size is not None:
+            self.used_bytes -= size
+        asset.unload()
+
+    def evict(self):
+        # The newest sound is about to be played, so it stays even if it's over the budget by itself
+        while self.used_bytes > self.budget_bytes and len(self.entries) > 1:
+            _, (asset, size) = self.entries.popitem(last=False)
+            # A channel that's still playing it keeps its own reference
+            asset.unload()
+            self.used_bytes -= size
+            self.evictions += 1
+
+    def get_hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
+
+sound_cache = SoundCache(SOUND_CACHE_BUDGET)
+
 class SoundType(Enum):
     """Enum for all the sound types in the game. If a sound's value is a list of strings, the sound will randomly play one of the sounds in the list."""
     BUY_ITEM = "chaChing.wav"
@@ -22,10 +105,28 @@ class SoundType(Enum):
             paths = [paths]
         
         self.paths = paths
-        self.sounds = [pygame.mixer.Sound(get_asset("audio", path)) for path in paths]
+        self.sounds: list[Asset[pygame.mixer.Sound]] = [asset_manager.sound("audio", path) for path in paths]
     
     def get_sound(self: Self):
-        return self.sounds[random.randint(0, len(self.sounds) - 1)]
+        return sound_cache.get(self.sounds[sound_random.randint(0, len(self.sounds) - 1)])
+
+def load_track(path: str) -> pygame.mixer.Sound:
+    try:
+        return pygame.mixer.Sound(file=open_asset(path))
+    except (pygame.error, FileNotFoundError) as error:
+        # Music is optional; the rest of the game works fine without it
+        print(f"Couldn't load music track {path}: {error}")
+        return pygame.mixer.Sound(buffer=bytes(4))
+
+def get_track_asset(path: str) -> Asset[pygame.mixer.Sound]:
+    """Tracks are decoded into memory in the background, so switching to one never reads from the disk."""
+    return asset_manager.load(f"music:{path}", lambda: load_track(path), preload=False)
+
+# How many of a sound can play at once, if it isn't SOUND_VOICE_LIMIT
+VOICE_LIMITS = {
+    SoundType.BUY_ITEM: 3,
+    SoundType.SPEAKING_SOUND: 2,
+}
 
 class AudioManager:
     day_track: str = get_asset("audio", "main_track.wav")
@@ -34,49 +135,163 @@ class AudioManager:
     shop_track: str = get_asset("audio", "shop_track.wav")
     
     current_track: str = ""
+    # The track that should be playing; it starts once it has loaded
+    target_track: str = ""
+    # The track loaded ahead of being played, which is unloaded if a different one is prepared or played instead
+    prepared_track: str = ""
+    # The track fading out, which is unloaded once its channel has stopped
+    fading_track: str = ""
+    # Music crossfades between these two channels
+    music_channels: list[pygame.mixer.Channel]
+    music_channel_index: int = 0
+    
+    # A min-heap of (due time, order queued, sound), so sounds due at the same time play in the order they were queued
+    queued_sounds: list[tuple[int, int, SoundType]]
+    queued_count: int = 0
+    # When each sound type was last queued for, to drop duplicates
+    last_queued: dict[SoundType, int]
+    
+    # Sounds are only played on these channels, so nothing else can be cut off by them
+    channels: list[pygame.mixer.Channel]
+    channel_start_times: list[int]
+    # The channels playing each sound type and what they're playing, oldest first
+    voices: dict[SoundType, deque[tuple[pygame.mixer.Channel, pygame.mixer.Sound]]]
+    
+    # When disabled (e.g. when running headless), no music or sounds are played at all
+    enabled: bool = True
     
-    queued_sounds: list[tuple[int, pygame.mixer.Sound]] = []
+    def __init__(self: Self):
+        self.queued_sounds = []
+        self.last_queued = {}
+        self.voices = {sound_type: deque() for sound_type in SoundType}
+        
+        if pygame.mixer.get_init() is None:
+            self.music_channels = []
+            self.channels = []
+        else:
+            # The first two channels are reserved for music, so sounds played by anything else can't take them
+            pygame.mixer.set_num_channels(2 + SOUND_CHANNELS)
+            pygame.mixer.set_reserved(2)
+            self.music_channels = [pygame.mixer.Channel(0), pygame.mixer.Channel(1)]
+            self.channels = [pygame.mixer.Channel(2 + i) for i in range(SOUND_CHANNELS)]
+        self.channel_start_times = [0] * len(self.channels)
     
     def play_day_track(self: Self):
-        if self.current_track == self.day_track:
-            return
-        self.current_track = self.day_track
-        pygame.mixer.music.load(self.day_track)
-        pygame.mixer.music.play(-1)
+        self.play_track(self.day_track)
     
     def play_scary_night_track(self: Self):
-        if self.current_track == self.scary_night_track:
-            return
-        self.current_track = self.scary_night_track
-        pygame.mixer.music.load(self.scary_night_track)
-        pygame.mixer.music.play(-1)
+        self.play_track(self.scary_night_track)
     
     def play_night_track(self: Self):
-        if self.current_track == self.night_track:
-            return
-        self.current_track = self.night_track
-        pygame.mixer.music.load(self.night_track)
-        pygame.mixer.music.play(-1)
+        self.play_track(self.night_track)
     
     def play_shop_track(self: Self):
-        if self.current_track == self.shop_track:
+        self.play_track(self.shop_track)
+    
+    def prepare_track(self: Self, track: str):
+        """Starts loading a track that's going to be played soon."""
+        if not self.enabled or track == self.prepared_track:
             return
-        self.current_track = self.shop_track
-        pygame.mixer.music.load(self.shop_track)
-        pygame.mixer.music.play(-1)
+        previous_prepared, self.prepared_track = self.prepared_track, track
+        self.unload_unused_track(previous_prepared)
+        asset_manager.request([get_track_asset(track)])
+    
+    def unload_unused_track(self: Self, track: str):
+        if track and track not in (self.current_track, self.target_track, self.prepared_track, self.fading_track):
+            sound_cache.release(get_track_asset(track))
+    
+    def play_track(self: Self, track: str):
+        """Crossfades to a track as soon as it's loaded. Until then, the current one keeps playing."""
+        if not self.enabled or self.target_track == track:
+            return
+        previous_target = self.target_track
+        self.target_track = track
+        self.prepare_track(track)
+        # A track that was going to play and never started isn't needed anymore
+        self.unload_unused_track(previous_target)
+        self.switch_track()
+    
+    def switch_track(self: Self):
+        if self.current_track == self.target_track or not self.music_channels:
+            return
+        asset = get_track_asset(self.target_track)
+        if not asset.is_decoded():
+            return
+        
+        # A track that was still fading out is cut off by this one
+        previous_fading_track = self.fading_track
+        self.fading_track = self.current_track
+        self.current_track = self.target_track
+        if self.prepared_track == self.current_track:
+            self.prepared_track = ""
+        self.unload_unused_track(previous_fading_track)
+        
+        # Both channels are mixed together, so the fades line up to the sample
+        self.music_channels[self.music_channel_index].fadeout(MUSIC_CROSSFADE)
+        self.music_channel_index = 1 - self.music_channel_index
+        self.music_channels[self.music_channel_index].play(asset.get(), loops=-1, fade_ms=MUSIC_CROSSFADE)
+    
+    def update_tracks(self: Self):
+        # Tracks are big; the one fading out is unloaded as soon as it's done
+        if self.fading_track and not self.music_channels[1 - self.music_channel_index].get_busy():
+            fading_track, self.fading_track = self.fading_track, ""
+            self.unload_unused_track(fading_track)
+        # Loaded tracks count toward the sound cache's budget
+        for track in (self.current_track, self.prepared_track, self.fading_track):
+            if track and get_track_asset(track).is_loaded():
+                sound_cache.pin(get_track_asset(track))
     
     def update(self: Self):
+        self.switch_track()
+        if self.music_channels:
+            self.update_tracks()
         self.play_sounds()
     
     def play_sounds(self: Self):
-        i = 0
-        while i < len(self.queued_sounds):
-            sound = self.queued_sounds[i]
-            if sound[0] <= pygame.time.get_ticks():
-                sound[1].play()
-                self.queued_sounds.pop(i)
-                i -= 1
-            i += 1
+        current_time = sim_clock.get_ticks()
+        while self.queued_sounds and self.queued_sounds[0][0] <= current_time:
+            _, _, sound_type = heapq.heappop(self.queued_sounds)
+            self.start_voice(sound_type, current_time)
+    
+    def get_free_channel(self: Self) -> Optional[pygame.mixer.Channel]:
+        """Returns a channel that isn't playing anything, or else stops the one that's been playing the longest."""
+        if not self.channels:
+            return None
+        for channel in self.channels:
+            if not channel.get_busy():
+                return channel
+        oldest = min(range(len(self.channels)), key=lambda i: self.channel_start_times[i])
+        self.channels[oldest].stop()
+        return self.channels[oldest]
+    
+    def start_voice(self: Self, sound_type: SoundType, current_time: int):
+        # Forget voices that have finished or were taken over by another sound
+        voices = deque(voice for voice in self.voices[sound_type] if voice[0].get_busy() and voice[0].get_sound() is voice[1])
+        self.voices[sound_type] = voices
+        
+        if len(voices) >= VOICE_LIMITS.get(sound_type, SOUND_VOICE_LIMIT):
+            # Steal the oldest voice of this sound
+            channel, _ = voices.popleft()
+            channel.stop()
+        else:
+            channel = self.get_free_channel()
+            if channel is None:
+                return
+        
+        sound = sound_type.get_sound()
+        channel.play(sound)
+        self.channel_start_times[self.channels.index(channel)] = current_time
+        voices.append((channel, sound))
     
     def play_sound(self: Self, sound: SoundType, delay_ms: int = 0):
-        self.queued_sounds.append((pygame.time.get_ticks() + delay_ms, sound.get_sound()))
\ No newline at end of file
+        if not self.enabled:
+            return
+        due_time = sim_clock.get_ticks() + delay_ms
+        # The same sound twice in a row within a few milliseconds just sounds louder
+        last_queued = self.last_queued.get(sound)
+        if last_queued is not None and abs(due_time - last_queued) < SOUND_DEDUP_WINDOW:
+            return
+        self.last_queued[sound] = due_time
+        
+        heapq.heappush(self.queued_sounds, (due_time, self.queued_count, sound))
+        self.queued_count += 1
\ No newline at end of file
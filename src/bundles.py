@@ -0,0 +1,92 @@
+"""
+On the web, every file is a separate request, so tools/web_prep.py packs the assets into a few bundles instead.
+web_assets/bundles.json lists the bundles in the order they're needed (the main menu's first) and which bundle
+each asset is in. A bundle is read into memory in one go the first time one of its assets is opened, and its
+assets are slices of that buffer.
+
+A bundle is a header (BUNDLE_HEADER), a JSON index of {path: [offset, length]} and then the files themselves.
+"""
+
+import io
+import json
+import struct
+from typing import BinaryIO, Optional
+
+from utils import is_web
+
+BUNDLE_MAGIC = b"FGBN"
+BUNDLE_VERSION = 1
+# magic, version, length of the index
+BUNDLE_HEADER = struct.Struct("<4sHI")
+BUNDLE_LIST = "web_assets/bundles.json"
+
+class Bundle:
+    path: str
+    data: Optional[memoryview] = None
+    # Where the files start; offsets in the index are from here
+    data_start: int = 0
+    index: dict[str, tuple[int, int]]
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index = {}
+
+    def load(self):
+        if self.data is not None:
+            return
+        with open(self.path, "rb") as file:
+            data = memoryview(file.read())
+        magic, version, index_length = BUNDLE_HEADER.unpack_from(data)
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+            raise ValueError(f"{self.path} isn't a version {BUNDLE_VERSION} bundle")
+        self.data_start = BUNDLE_HEADER.size + index_length
+        self.index = json.loads(bytes(data[BUNDLE_HEADER.size:self.data_start]))
+        self.data = data
+
+    def get(self, path: str) -> memoryview:
+        self.load()
+        offset, length = self.index[path]
+        return self.data[self.data_start + offset:self.data_start + offset + length]
+
+    @staticmethod
+    def pack(files: dict[str, bytes]) -> bytes:
+        """Used by tools/web_prep.py."""
+        index = {}
+        offset = 0
+        for path, data in files.items():
+            index[path] = [offset, len(data)]
+            offset += len(data)
+        index_bytes = json.dumps(index).encode()
+        return BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(index_bytes)) + index_bytes + b"".join(files.values())
+
+# The bundles in the order they're needed, and which one each asset (by its get_asset path) is in
+bundles: Optional[list[Bundle]] = None
+bundled_files: dict[str, Bundle] = {}
+
+def get_bundles() -> list[Bundle]:
+    global bundles
+    if bundles is None:
+        try:
+            with open(BUNDLE_LIST) as file:
+                bundle_list = json.load(file)
+        except FileNotFoundError:
+            # Running from a plain web_assets folder
+            bundle_list = {"bundles": [], "files": {}}
+        bundles_by_name = {name: Bundle(f"web_assets/{name}") for name in bundle_list["bundles"]}
+        bundles = list(bundles_by_name.values())
+        for path, name in bundle_list["files"].items():
+            bundled_files[f"web_assets/{path}"] = bundles_by_name[name]
+    return bundles
+
+def open_asset(path: str) -> str | BinaryIO:
+    """
+    Returns something pygame can load the asset at path (from get_asset) from: on the web, a file over
+    the asset's slice of its bundle, and otherwise just the path.
+    """
+    if not is_web():
+        return path
+    get_bundles()
+    bundle = bundled_files.get(path)
+    if bundle is None:
+        return path
+    return io.BytesIO(bundle.get(path.removeprefix("web_assets/")))
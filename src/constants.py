@@ -27,13 +27,83 @@ MAP_HEIGHT = 35
 FARMABLE_MAP_START = (1, 1)
 FARMABLE_MAP_END = (34, 34)
 
+# The terrain is pre-rendered in square chunks of this many dual-grid cells
+TERRAIN_CHUNK_SIZE = 8
+# Chunks beyond this many are evicted, least recently drawn first. Visible chunks are never evicted.
+TERRAIN_CHUNK_CACHE_SIZE = 32
+# Entities are registered in a grid of square cells this many pixels wide, for finding the ones near something
+ENTITY_HASH_CELL_SIZE = TILE_SIZE * 4
+
 MAP_UPDATE_RATE = 750
 PARTICLES_PER_TILE_SECOND = 5
+# Maximum number of live particles; new ones are dropped while the pool is full
+PARTICLE_CAPACITY = 32768
+# Maximum number of distinct particle sprites (color, size, rotation and fade) kept around
+PARTICLE_SPRITE_CACHE_SIZE = 4096
+# The chance that each growing crop gets a random tick per map update
 RANDOM_TICK_PER_UPDATE_RATIO = 0.01
+# If true, random ticks keep the exact statistics of sampling ceil(MAP_WIDTH * MAP_HEIGHT * RANDOM_TICK_PER_UPDATE_RATIO)
+# tiles across the whole map, so crop growth speed depends on the map size like it used to
+EXACT_RANDOM_TICK_STATISTICS = False
+# How many tiles of open ground a shadow would rather cross than go through a wall
+FLOW_FIELD_WALL_COST = 8
+
+# The map is simulated in square regions of this many tiles; see SimulationLOD
+SIM_REGION_SIZE = 8
+# The area around the player that counts as on screen, in tiles. It doesn't follow the window's size, so
+# the simulation (and replays) doesn't depend on it; bigger windows may show a less often simulated edge
+SIM_VIEW_WIDTH = 24
+SIM_VIEW_HEIGHT = 14
+# Regions within this many tiles of that area are simulated every frame
+SIM_ACTIVE_MARGIN = 4
+# Regions up to this many regions further away are simulated less often; the rest wait until they're closer
+SIM_REDUCED_DISTANCE = 1
+# Seconds between updates of things in less often simulated regions
+SIM_REDUCED_STEP = 0.25
+# Map updates between random ticks of less often simulated regions
+SIM_REDUCED_MAP_UPDATES = 4
+# The simulation always advances in steps of this many seconds, however fast the game is drawn
+SIM_STEP = 1 / 60
+# At most this many steps are run per frame; a slower frame than that loses the rest of its time
+MAX_SIM_STEPS_PER_FRAME = 5
+# How quickly the camera catches up with the player, per second
+CAMERA_FOLLOW_SPEED = 5
+
+MAX_PLANT_GROWTH_STAGE = 2
 
 # Graphical stuff
 NIGHT_OPACITY = 150
 
+# Rendered text is cached up to this many bytes of surfaces
+TEXT_CACHE_BUDGET = 8 * 1024 * 1024
+
+# Assets are decoded on this many background threads (none on the web)
+ASSET_LOADER_THREADS = 4
+# Milliseconds per frame spent finishing loaded assets on the main thread
+ASSET_LOAD_BUDGET = 4
+
+# Loaded sounds are kept up to this many bytes of samples; the least recently played ones are unloaded past it.
+# Loaded music tracks count toward it too, and there are two of them during a crossfade
+SOUND_CACHE_BUDGET = 12 * 1024 * 1024
+
+# Sound effects play on their own pool of mixer channels
+SOUND_CHANNELS = 16
+# How many of the same sound can play at once; starting another stops the oldest one
+SOUND_VOICE_LIMIT = 4
+# The same sound queued again within this many milliseconds is dropped
+SOUND_DEDUP_WINDOW = 30
+
+# Milliseconds the music takes to crossfade to another track
+MUSIC_CROSSFADE = 1500
+
+# Static sprites are packed into texture atlas pages of this size, in pixels
+ATLAS_PAGE_SIZE = 1024
+
+# The frame timer overlay (F3) shows percentiles over this many frames
+FRAME_TIMER_HISTORY = 600
+FRAME_TIMER_GRAPH_MAX_MS = 50
+FRAME_TIMER_OVERLAY_REFRESH = 0.25 # Seconds
+
 CROSSHAIR_ONLY_WITH_JOYSTICK = False
 CROSSHAIR_SIZE = 10
 CROSSHAIR_COLOR = (255, 255, 255)
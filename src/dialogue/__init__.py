@@ -6,7 +6,8 @@ split into a different file or renamed to something more appropriate. I'll leave
 
 from abc import ABC, abstractmethod
 from enum import StrEnum
-from typing import Callable, TYPE_CHECKING
+import heapq
+from typing import Callable, Optional, TYPE_CHECKING
 import pygame
 from audio import AudioManager
 from constants import ITEM_SLOT_ITEM_SIZE, ITEM_SLOT_MARGIN, ITEM_SLOT_PADDING, MAP_HEIGHT, MAP_WIDTH, TILE_SIZE
@@ -14,6 +15,7 @@ from dialogue.renderer import DialogueRenderer
 from graphics import get_height, get_width
 from graphics.floating_hint_text import FloatingHintText, add_floating_text_hint
 from items import Item
+import sim_clock
 from utils import get_username
 
 if TYPE_CHECKING:
@@ -49,21 +51,31 @@ class WorldEvent(StrEnum):
 class ConditionState:
     # Maps WorldEvent to the time it was triggered
     world_events: dict[WorldEvent, int | None]
+    # Called with the event whenever an event is added or cleared
+    listeners: list[Callable[[WorldEvent], None]]
     def __init__(self) -> None:
         self.world_events = {}
         self.game_messages = set()
+        self.listeners = []
+    
+    def add_listener(self, listener: Callable[[WorldEvent], None]):
+        self.listeners.append(listener)
     
     def add_event(self, event: WorldEvent):
-        self.world_events[event] = pygame.time.get_ticks()
+        self.world_events[event] = sim_clock.get_ticks()
+        for listener in self.listeners:
+            listener(event)
     def clear_event(self, event: WorldEvent):
         self.world_events[event] = None
+        for listener in self.listeners:
+            listener(event)
     def has_event(self, event: WorldEvent) -> bool:
         return event in self.world_events and self.world_events[event] != None
     
     def time_since_event(self, event: WorldEvent) -> int | None:
         if event not in self.world_events or self.world_events[event] == None:
             return None
-        return pygame.time.get_ticks() - self.world_events[event]
+        return sim_clock.get_ticks() - self.world_events[event]
 
 # Conditions
 
@@ -72,6 +84,33 @@ class DialogueCondition(ABC):
     def check(self, condition_state: ConditionState) -> bool:
         pass
 
+    def get_dependencies(self) -> Optional[set[WorldEvent]]:
+        """
+        Returns the events whose changes can change the result of check, or None if the
+        condition depends on something else and has to be checked every frame.
+        """
+        return None
+
+    def get_next_change_time(self, condition_state: ConditionState) -> Optional[int]:
+        """
+        Returns the earliest time (in sim_clock ticks) at which the result of check can change just
+        because time passed, or None if it can only change when events do.
+        """
+        return None
+
+def get_combined_dependencies(conditions: list[DialogueCondition]) -> Optional[set[WorldEvent]]:
+    dependencies = set()
+    for condition in conditions:
+        condition_dependencies = condition.get_dependencies()
+        if condition_dependencies is None:
+            return None
+        dependencies |= condition_dependencies
+    return dependencies
+
+def get_earliest_change_time(conditions: list[DialogueCondition], condition_state: ConditionState) -> Optional[int]:
+    times = [time for condition in conditions if (time := condition.get_next_change_time(condition_state)) is not None]
+    return min(times, default=None)
+
 class AndCondition(DialogueCondition):
     conditions: list[DialogueCondition]
 
@@ -81,6 +120,12 @@ class AndCondition(DialogueCondition):
     def check(self, condition_state: ConditionState) -> bool:
         return all(c.check(condition_state) for c in self.conditions)
 
+    def get_dependencies(self) -> Optional[set[WorldEvent]]:
+        return get_combined_dependencies(self.conditions)
+
+    def get_next_change_time(self, condition_state: ConditionState) -> Optional[int]:
+        return get_earliest_change_time(self.conditions, condition_state)
+
 class OrCondition(DialogueCondition):
     conditions: list[DialogueCondition]
 
@@ -90,6 +135,12 @@ class OrCondition(DialogueCondition):
     def check(self, condition_state: ConditionState) -> bool:
         return any(c.check(condition_state) for c in self.conditions)
 
+    def get_dependencies(self) -> Optional[set[WorldEvent]]:
+        return get_combined_dependencies(self.conditions)
+
+    def get_next_change_time(self, condition_state: ConditionState) -> Optional[int]:
+        return get_earliest_change_time(self.conditions, condition_state)
+
 class BeforeEventCondition(DialogueCondition):
     event: WorldEvent
 
@@ -99,6 +150,9 @@ class BeforeEventCondition(DialogueCondition):
     def check(self, condition_state: ConditionState) -> bool:
         return condition_state.time_since_event(self.event) == None
 
+    def get_dependencies(self) -> Optional[set[WorldEvent]]:
+        return {self.event}
+
 class AfterEventCondition(DialogueCondition):
     event: WorldEvent
     elapsed_time: int
@@ -108,7 +162,17 @@ class AfterEventCondition(DialogueCondition):
         self.elapsed_time = elapsed_ms
 
     def check(self, condition_state: ConditionState) -> bool:
-        return condition_state.time_since_event(self.event) != None and condition_state.time_since_event(self.event) >= self.elapsed_time
+        time_since_event = condition_state.time_since_event(self.event)
+        return time_since_event != None and time_since_event >= self.elapsed_time
+
+    def get_dependencies(self) -> Optional[set[WorldEvent]]:
+        return {self.event}
+
+    def get_next_change_time(self, condition_state: ConditionState) -> Optional[int]:
+        time_since_event = condition_state.time_since_event(self.event)
+        if time_since_event == None or time_since_event >= self.elapsed_time:
+            return None
+        return condition_state.world_events[self.event] + self.elapsed_time
 
 class NotCondition(DialogueCondition):
     condition: DialogueCondition
@@ -119,14 +183,25 @@ class NotCondition(DialogueCondition):
     def check(self, condition_state: ConditionState) -> bool:
         return not self.condition.check(condition_state)
 
+    def get_dependencies(self) -> Optional[set[WorldEvent]]:
+        return self.condition.get_dependencies()
+
+    def get_next_change_time(self, condition_state: ConditionState) -> Optional[int]:
+        return self.condition.get_next_change_time(condition_state)
+
 class AlwaysCondition(DialogueCondition):
     def check(self, condition_state: ConditionState) -> bool:
         return True
+    def get_dependencies(self) -> Optional[set[WorldEvent]]:
+        return set()
 class NeverCondition(DialogueCondition):
     def check(self, condition_state: ConditionState) -> bool:
         return False
+    def get_dependencies(self) -> Optional[set[WorldEvent]]:
+        return set()
 
 class LambdaCondition(DialogueCondition):
+    """Can depend on anything, so it's checked every frame."""
     func: Callable[[ConditionState], bool]
 
     def __init__(self, func: Callable[[ConditionState], bool]) -> None:
@@ -376,8 +451,8 @@ class SetPlayerPositionAction(DialogueAction):
         self.x = x
         self.y = y
     def start(self, action_context: DialogueActionContext) -> None:
-        action_context.player.pos.x = self.x
-        action_context.player.pos.y = self.y
+        action_context.player.teleport(self.x, self.y)
+        action_context.queued_game_actions.append("camera:snap")
 
 class ForcePlayerWalkAction(DialogueAction):
     x: float
@@ -629,6 +704,81 @@ class DialogueManager:
         ), True),
     ]
     running_actions: list[DialogueAction] = []
+    
+    # Triggers are only re-checked when an event their condition depends on changes, or when a timer runs
+    # out for a condition that becomes true some time after an event. Everything is by index into dialogue_triggers.
+    triggers_by_event: Optional[dict[WorldEvent, list[int]]] = None
+    # Triggers whose conditions can't tell what they depend on, so they're checked every frame
+    unindexed_triggers: list[int]
+    dirty_triggers: set[int]
+    # Heap of (time, trigger); entries that no longer match trigger_timer_times are stale and skipped
+    trigger_timers: list[tuple[int, int]]
+    trigger_timer_times: dict[int, int]
+    # While checking triggers, the one being checked and a heap of the ones left to check this frame
+    checking_trigger: Optional[int] = None
+    triggers_to_check: list[int]
+    
+    def index_triggers(self):
+        self.triggers_by_event = {}
+        self.unindexed_triggers = []
+        for index, trigger in enumerate(self.dialogue_triggers):
+            dependencies = trigger.condition.get_dependencies()
+            if dependencies is None:
+                self.unindexed_triggers.append(index)
+                continue
+            for event in dependencies:
+                self.triggers_by_event.setdefault(event, []).append(index)
+        
+        # Everything is checked once to start with
+        self.dirty_triggers = set(range(len(self.dialogue_triggers)))
+        self.trigger_timers = []
+        self.trigger_timer_times = {}
+        self.triggers_to_check = []
+        self.condition_state.add_listener(self.on_event_changed)
+    
+    def on_event_changed(self, event: WorldEvent):
+        for index in self.triggers_by_event.get(event, ()):
+            if self.checking_trigger is not None and index > self.checking_trigger:
+                # Triggers later in the list see the change this frame, like they would if every trigger was checked in order
+                heapq.heappush(self.triggers_to_check, index)
+            else:
+                self.dirty_triggers.add(index)
+    
+    def schedule_trigger_timer(self, index: int):
+        time = self.dialogue_triggers[index].condition.get_next_change_time(self.condition_state)
+        if time is None:
+            self.trigger_timer_times.pop(index, None)
+        elif self.trigger_timer_times.get(index) != time:
+            self.trigger_timer_times[index] = time
+            heapq.heappush(self.trigger_timers, (time, index))
+    
+    def check_triggers(self, action_context: DialogueActionContext):
+        if self.triggers_by_event is None:
+            self.index_triggers()
+        
+        now = sim_clock.get_ticks()
+        while self.trigger_timers and self.trigger_timers[0][0] <= now:
+            time, index = heapq.heappop(self.trigger_timers)
+            if self.trigger_timer_times.get(index) == time:
+                del self.trigger_timer_times[index]
+                self.dirty_triggers.add(index)
+        
+        self.triggers_to_check = list(self.dirty_triggers.union(self.unindexed_triggers))
+        heapq.heapify(self.triggers_to_check)
+        self.dirty_triggers = set()
+        
+        while self.triggers_to_check:
+            index = heapq.heappop(self.triggers_to_check)
+            if index == self.checking_trigger:
+                continue
+            self.checking_trigger = index
+            
+            trigger = self.dialogue_triggers[index]
+            if trigger.check(self.condition_state):
+                trigger.action.start(action_context)
+                self.running_actions.append(trigger.action)
+            self.schedule_trigger_timer(index)
+        self.checking_trigger = None
 
     def queue_dialogue(self, lines: list[str]):
         self.queue.append(list(lines)) # Copy the list to prevent modification of the original
@@ -658,10 +808,7 @@ class DialogueManager:
         lazy and don't have enough time to mess with refactors.
         """
         action_context = DialogueActionContext(self, audio_manager, player)
-        for trigger in self.dialogue_triggers:
-            if trigger.check(self.condition_state):
-                trigger.action.start(action_context)
-                self.running_actions.append(trigger.action)
+        self.check_triggers(action_context)
         for action in self.running_actions:
             action.update(action_context, delta)
             if action.is_finished(action_context):
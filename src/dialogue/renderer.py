@@ -1,7 +1,7 @@
 import pygame
 from audio import AudioManager, SoundType
 from constants import SLOT_BACKGROUND
-from graphics import get_width, normal_font_render, small_font_render
+from graphics import FONT, SMALL_FONT, get_width
 from items import ITEM_SLOT_BORDER_RADIUS
 
 class DialogueRenderer:
@@ -13,6 +13,11 @@ class DialogueRenderer:
     talking_sound_counter: int = 0
     letters_per_talking_sound: int = 3
     
+    # The lines that are currently laid out, and for each of them, its rendered surface and the x offset
+    # at which every character starts (plus the line's end), so the typewriter effect can just clip the surface
+    layout_lines: tuple[str, ...] = ()
+    layout: list[tuple[pygame.Surface, list[int]]] = []
+    
     def reset(self):
         self.done = False
         self.current_char = 0
@@ -23,6 +28,24 @@ class DialogueRenderer:
         self.current_line = len(lines) - 1
         self.current_char = len(lines[self.current_line])
     
+    @staticmethod
+    def layout_line(font: pygame.font.Font, line: str) -> tuple[pygame.Surface, list[int]]:
+        offsets = [0]
+        for char, metrics in zip(line, font.metrics(line)):
+            # Characters the font doesn't have get no metrics
+            advance = metrics[4] if metrics is not None else font.size(char)[0]
+            offsets.append(offsets[-1] + advance)
+        surface = font.render(line, True, 'white')
+        # The last glyph can overhang its advance, so make sure the whole line shows once it's typed out
+        offsets[-1] = max(offsets[-1], surface.get_width())
+        return surface, offsets
+    
+    def get_layout(self, lines: list[str]) -> list[tuple[pygame.Surface, list[int]]]:
+        if tuple(lines) != self.layout_lines:
+            self.layout_lines = tuple(lines)
+            self.layout = [self.layout_line(FONT if i == 0 else SMALL_FONT, line) for i, line in enumerate(lines)]
+        return self.layout
+    
     def draw(self, win: pygame.Surface, lines: list[str]):
         pygame.draw.rect(
             win,
@@ -33,14 +56,13 @@ class DialogueRenderer:
 
         y = 25
 
-        for i, line in enumerate(lines):
+        for i, (t, offsets) in enumerate(self.get_layout(lines)):
             if i <= self.current_line:
-                if i == 0:
-                    t = normal_font_render(line if i != self.current_line else line[:self.current_char], 'white')
+                if i == self.current_line:
+                    # Only show the characters typed so far
+                    win.blit(t, (16 + get_width() // 2 - 295, 16 + y), (0, 0, offsets[self.current_char], t.get_height()))
                 else:
-                    t = small_font_render(line if i != self.current_line else line[:self.current_char], 'white')
-
-                win.blit(t, (16 + get_width() // 2 - 295, 16 + y))
+                    win.blit(t, (16 + get_width() // 2 - 295, 16 + y))
                 
                 y += t.get_height() + 5
     
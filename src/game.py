@@ -1,11 +1,16 @@
+from typing import Optional
+from assets import asset_manager
 from dialogue import DialogueManager
 import game_scene
 from graphics import WIN, draw_all_deferred
+from graphics.frame_timer import frame_timer
 from inputs import InputType, Inputs
 from audio import AudioManager
 from player import Player
 import constants
 import pygame
+from replay import DIALOGUE_CONFIRM, InputRecorder, InputReplayer
+import sim_clock
 
 from utils import is_web
 
@@ -21,6 +26,22 @@ class Game:
     should_quit_game: bool = False
     inputs: Inputs = Inputs()
     
+    # If false, the game only runs its logic and never draws to the window (e.g. when running headless)
+    rendering: bool = True
+    
+    # At most one of these is set; see replay.py
+    recorder: Optional[InputRecorder] = None
+    replayer: Optional[InputReplayer] = None
+    # Inputs dispatched during the current frame, for recording
+    dispatched_inputs: list[int] = []
+    
+    # The scene is updated in fixed steps of sim_step seconds; frame time that isn't a whole step yet waits here
+    sim_step: float = constants.SIM_STEP
+    max_sim_steps: int = constants.MAX_SIM_STEPS_PER_FRAME
+    sim_accumulator: float = 0
+    # How far the next step is along (0 to 1), for drawing things between their last two positions
+    interpolation: float = 1
+    
     # This is kind of a hacky way to structure this, but it works...
     playing_game_scene: game_scene.GameScene
     
@@ -46,6 +67,10 @@ class Game:
         self.dialogue_manager.add_game_message("enter:" + new_scene.name)
 
     def enter_playing_scene(self):
+        if not asset_manager.is_done():
+            from game_scene.loading import LoadingScene
+            self.update_scene(LoadingScene(self, self.playing_game_scene))
+            return
         self.update_scene(self.playing_game_scene)
     
     def start(self, initial_scene: game_scene.GameScene):
@@ -53,14 +78,45 @@ class Game:
         self.current_scene.enter()
     
     def run(self, delta: float):
-        global WIN
+        frame_timer.begin_frame()
         
-        self.inputs.update(self.current_scene.get_target_reference())
+        self.update(delta)
+        if self.rendering and not self.should_quit_game:
+            self.draw()
         
-        for event in pygame.event.get():
-            self.handle_event(event)
+        frame_timer.end_frame()
+    
+    def update(self, delta: float):
+        if self.replayer is not None:
+            frame = self.replayer.next_frame()
+            if frame is None:
+                self.should_quit_game = True
+                return
+            delta = frame.delta
         
-        queued_game_actions = self.dialogue_manager.update(delta, self.audio_manager, self.player)
+        with frame_timer.section("assets"):
+            asset_manager.update()
+        
+        self.dispatched_inputs = []
+        if self.replayer is not None:
+            self.inputs.set_state(frame.input_state)
+            # Only quitting is taken from the real events while replaying
+            for event in pygame.event.get(pygame.QUIT):
+                self.should_quit_game = True
+            for input_code in frame.input_codes:
+                self.dispatch_input(input_code)
+        else:
+            self.inputs.update(self.current_scene.get_target_reference())
+            input_state = self.inputs.get_state()
+            
+            for event in pygame.event.get():
+                self.handle_event(event)
+            
+            if self.recorder is not None:
+                self.recorder.record_frame(delta, input_state, self.dispatched_inputs)
+        
+        with frame_timer.section("dialogue update"):
+            queued_game_actions = self.dialogue_manager.update(delta, self.audio_manager, self.player)
         for action in queued_game_actions:
             match action:
                 case "scene:shop":
@@ -71,23 +127,69 @@ class Game:
                     from game_scene.playing import PlayingGameScene
                     if isinstance(self.current_scene, PlayingGameScene):
                         self.current_scene.scary_night_occurances_started = True
+                case "camera:snap":
+                    from game_scene.playing import PlayingGameScene
+                    if isinstance(self.current_scene, PlayingGameScene):
+                        self.current_scene.snap_camera()
                 case _:
                     print(f"Unknown queued game action: {action}")
         
-        self.current_scene.update(self.inputs, delta)
-        self.audio_manager.update()
+        with frame_timer.section("scene update"):
+            self.sim_accumulator += delta
+            steps = 0
+            while self.sim_accumulator >= self.sim_step:
+                if steps == self.max_sim_steps:
+                    # Too far behind to catch up; drop the rest so slow frames don't make the next ones slower
+                    self.sim_accumulator %= self.sim_step
+                    break
+                sim_clock.advance(self.sim_step)
+                self.current_scene.update(self.inputs, self.sim_step)
+                self.inputs.end_step()
+                self.sim_accumulator -= self.sim_step
+                steps += 1
+            self.interpolation = self.sim_accumulator / self.sim_step
+        with frame_timer.section("audio"):
+            self.audio_manager.update()
+    
+    def draw(self):
+        global WIN
         
-        self.current_scene.draw(WIN, self.inputs)
-        self.dialogue_manager.draw(WIN)
+        with frame_timer.section("scene draw"):
+            self.current_scene.draw(WIN, self.inputs)
+        with frame_timer.section("dialogue draw"):
+            self.dialogue_manager.draw(WIN)
+            draw_all_deferred()
         
-        draw_all_deferred()
+        if frame_timer.visible:
+            with frame_timer.section("frame timer"):
+                frame_timer.draw(WIN)
         
         if is_web():
             from platform import window
             if int(window.innerWidth) != WIN.get_width() or int(window.innerHeight) != WIN.get_height():
                 WIN = pygame.display.set_mode((window.innerWidth, window.innerHeight))
         
-        pygame.display.flip()
+        with frame_timer.section("display flip"):
+            pygame.display.flip()
+    
+    def dispatch_input(self, input_code: int):
+        """
+        Sends an input to the game. input_code is an InputType value, or DIALOGUE_CONFIRM.
+        Every input goes through here so it can be recorded and replayed.
+        """
+        self.dispatched_inputs.append(input_code)
+        
+        if input_code == DIALOGUE_CONFIRM:
+            self.dialogue_manager.on_confirm()
+            return
+        
+        input_type = InputType(input_code)
+        if input_type == InputType.TOGGLE_FRAME_TIMER:
+            frame_timer.toggle()
+            return
+        
+        self.current_scene.event_input(input_type)
+        self.inputs.input_event(input_type)
     
     def handle_event(self, event: pygame.Event):
         if event.type == pygame.QUIT:
@@ -98,55 +200,54 @@ class Game:
             self.inputs.joystick_update()
             return
         
+        # Works even while dialogue is shown, so it doesn't confirm it
+        if event.type == pygame.KEYDOWN and InputType.from_keyboard_input(event.key, True) == InputType.TOGGLE_FRAME_TIMER:
+            self.dispatch_input(InputType.TOGGLE_FRAME_TIMER.value)
+            return
+        
         if self.dialogue_manager.is_shown() and event.type in [pygame.KEYDOWN, pygame.JOYBUTTONDOWN, pygame.MOUSEBUTTONDOWN]:
-            self.dialogue_manager.on_confirm()
+            self.dispatch_input(DIALOGUE_CONFIRM)
             return
         
         if event.type == pygame.KEYDOWN:
             input_type = InputType.from_keyboard_input(event.key, True)
             if input_type is not None:
-                self.current_scene.event_input(input_type)
-                self.inputs.input_event(input_type)
+                self.dispatch_input(input_type.value)
             return
         if event.type == pygame.KEYUP:
             input_type = InputType.from_keyboard_input(event.key, False)
             if input_type is not None:
-                self.current_scene.event_input(input_type)
-                self.inputs.input_event(input_type)
+                self.dispatch_input(input_type.value)
             return
         
         if event.type == pygame.JOYBUTTONDOWN:
             input_type = InputType.from_controller_input(event.button, True)
             if input_type is not None:
-                self.current_scene.event_input(input_type)
-                self.inputs.input_event(input_type)
+                self.dispatch_input(input_type.value)
             return
         if event.type == pygame.JOYBUTTONUP:
             input_type = InputType.from_controller_input(event.button, False)
             if input_type is not None:
-                self.current_scene.event_input(input_type)
-                self.inputs.input_event(input_type)
+                self.dispatch_input(input_type.value)
             return
         
         if event.type == pygame.MOUSEBUTTONDOWN:
             input_type = InputType.from_mouse_input(event.button, True)
             if input_type is not None:
-                self.current_scene.event_input(input_type)
-                self.inputs.input_event(input_type)
+                self.dispatch_input(input_type.value)
             return
         if event.type == pygame.MOUSEBUTTONUP:
             input_type = InputType.from_mouse_input(event.button, False)
             if input_type is not None:
-                self.current_scene.event_input(input_type)
-                self.inputs.input_event(input_type)
+                self.dispatch_input(input_type.value)
             return
         if event.type == pygame.MOUSEWHEEL:
             if event.y > 0:
                 for _ in range(event.y):
-                    self.current_scene.event_input(InputType.INVENTORY_SCROLL_UP)
+                    self.dispatch_input(InputType.INVENTORY_SCROLL_UP.value)
             else:
                 for _ in range(-event.y):
-                    self.current_scene.event_input(InputType.INVENTORY_SCROLL_DOWN)
+                    self.dispatch_input(InputType.INVENTORY_SCROLL_DOWN.value)
             return
         
         #     elif event.type == pygame.MOUSEBUTTONDOWN:
@@ -83,15 +83,13 @@ class InShopScene(GameScene):
     
     def event_input(self: Self, type: InputType):
         if type == InputType.CLICK_DOWN:
-            mx, my = pygame.mouse.get_pos()
             for b in self.shop_buttons:
-                b.on_click(mx, my)
+                b.on_click(self.game.inputs.mouse_x, self.game.inputs.mouse_y)
             return
 
         if type == InputType.CANCEL:
             self.exit_shop()
     
     def update(self: Self, inputs: Inputs, dt: float):
-        mx, my = pygame.mouse.get_pos()
         for b in self.shop_buttons:
-            b.check_hover(mx, my)
\ No newline at end of file
+            b.check_hover(inputs.mouse_x, inputs.mouse_y)
\ No newline at end of file
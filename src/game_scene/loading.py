@@ -0,0 +1,33 @@
+from typing import Self
+
+import pygame
+from assets import asset_manager
+from game import Game
+from game_scene import GameScene
+from graphics import get_height, get_width, small_font_render
+from inputs import Inputs
+
+LOADING_BAR_WIDTH = 400
+LOADING_BAR_HEIGHT = 16
+
+class LoadingScene(GameScene):
+    """Shown when a scene is entered before the assets that were requested at startup have finished loading."""
+    next_scene: GameScene
+
+    def __init__(self: Self, game: Game, next_scene: GameScene):
+        super().__init__(game, "loading")
+        self.next_scene = next_scene
+
+    def update(self: Self, inputs: Inputs, dt: float):
+        if asset_manager.is_done():
+            self.game.update_scene(self.next_scene)
+
+    def draw(self: Self, win: pygame.Surface, inputs: Inputs):
+        win.fill("#000000")
+
+        x = get_width() // 2 - LOADING_BAR_WIDTH // 2
+        y = get_height() // 2 - LOADING_BAR_HEIGHT // 2
+        pygame.draw.rect(win, "#303030", (x, y, LOADING_BAR_WIDTH, LOADING_BAR_HEIGHT))
+        pygame.draw.rect(win, "#bbff70", (x, y, LOADING_BAR_WIDTH * asset_manager.get_progress(), LOADING_BAR_HEIGHT))
+
+        win.blit(t := small_font_render(f"Loading... {asset_manager.get_progress() * 100:.0f}%"), (get_width() // 2 - t.get_width() // 2, y - 10 - t.get_height()))
@@ -1,23 +1,23 @@
 
 import math
-import random
 from typing import Self
 import pygame
 
 from items import get_slot_bounds
 
-from constants import CROSSHAIR_COLOR, CROSSHAIR_ONLY_WITH_JOYSTICK, CROSSHAIR_SIZE, CROSSHAIR_THICKNESS,\
+from constants import CAMERA_FOLLOW_SPEED, CROSSHAIR_COLOR, CROSSHAIR_ONLY_WITH_JOYSTICK, CROSSHAIR_SIZE, CROSSHAIR_THICKNESS,\
     DAY_LENGTH, DUSK_DAWN_LENGTH, INTERACTABLE_SELECTION_COLOR, MAP_HEIGHT, MAP_WIDTH, NIGHT_LENGTH, NIGHT_OPACITY,\
     NON_INTERACTABLE_SELECTION_COLOR, NOTHING_SELECTION_COLOR, TILE_SIZE
 from dialogue import WorldEvent
 from game import Game
 from game_scene import GameScene
-from graphics import big_font_render, get_height, get_width, giant_font_render
+from graphics import big_font_render, effects_random, get_height, get_width, giant_font_render
 from graphics.floating_hint_text import draw_floating_hint_texts
+from graphics.frame_timer import frame_timer
 from graphics.particles import draw_particles, update_particles
 from inputs import InputType, Inputs
 from map import Map
-from map.entity import Entity, ShadowMachine
+from map.entity import Entity
 from player import Player
 from utils import clamp, ease
 
@@ -37,12 +37,15 @@ class PlayingGameScene(GameScene):
     selected_cell_y: int = 0
     target_x: float = 0
     target_y: float = 0
-    farm: Map = Map()
+    farm: Map
     
     selection_color: str = NOTHING_SELECTION_COLOR
     camera_position: pygame.Vector2
+    # Where the camera was before the last update, for drawing between simulation steps
+    previous_camera_position: pygame.Vector2
     
     day_cycle_time: float = 0
+    days_passed: int = 0
     was_day: bool = True
     day_fade_surface = pygame.Surface((get_width(), get_height()), pygame.SRCALPHA)
     
@@ -51,6 +54,8 @@ class PlayingGameScene(GameScene):
     def __init__(self: Self, game: Game):
         super().__init__(game, "playing")
         self.camera_position = game.player.pos.copy()
+        self.previous_camera_position = self.camera_position.copy()
+        self.farm = Map()
         
         self.day_fade_surface.fill((0, 0, 15))
         
@@ -62,17 +67,29 @@ class PlayingGameScene(GameScene):
         self.update_playing_track()
         self.game.dialogue_manager.condition_state.add_event(WorldEvent.GameStart)
         self.camera_position = self.game.player.pos.copy()
+        self.previous_camera_position = self.camera_position.copy()
+    
+    def get_camera_target(self: Self) -> pygame.Vector2:
+        camera_target = self.game.player.pos.copy()
+        camera_target.x = clamp(camera_target.x, get_width() // 2, TILE_SIZE * MAP_WIDTH - get_width() // 2)
+        camera_target.y = clamp(camera_target.y, get_height() // 2, TILE_SIZE * MAP_HEIGHT - get_height() // 2)
+        return camera_target
+    
+    def snap_camera(self: Self):
+        # Jumps straight to the player instead of panning (or being drawn between the old and new spots)
+        self.camera_position = self.get_camera_target()
+        self.previous_camera_position = self.camera_position.copy()
     
     def get_target_reference(self: Self):
         return self.game.player.pos - self.camera_position + pygame.Vector2(get_width() // 2, get_height() // 2)
     
     def update(self: Self, inputs: Inputs, dt: float):
         player = self.game.player
+        self.previous_camera_position = self.camera_position.copy()
         player.update(inputs.movement_x, inputs.movement_y, self.farm, dt)
         
         # Interaction
-        mx, my = pygame.mouse.get_pos()
-        if player.over_ui(mx, my):
+        if player.over_ui(inputs.mouse_x, inputs.mouse_y):
             self.selection_color = NOTHING_SELECTION_COLOR
         else:
             selected_item = player.get_selected_item()
@@ -94,14 +111,16 @@ class PlayingGameScene(GameScene):
                     player.wait_for_mouseup = False
         
         # General updates
-        update_particles(dt)
-        self.farm.update(self.game.audio_manager, self.game.dialogue_manager)
+        with frame_timer.section("particle update"):
+            update_particles(dt)
+        with frame_timer.section("map update"):
+            self.farm.lod.update(player.pos)
+            self.farm.update(dt, self.game.audio_manager, self.game.dialogue_manager)
         
-        camera_target = player.pos.copy()
-        camera_target.x = clamp(camera_target.x, get_width() // 2, TILE_SIZE * MAP_WIDTH - get_width() // 2)
-        camera_target.y = clamp(camera_target.y, get_height() // 2, TILE_SIZE * MAP_HEIGHT - get_height() // 2)
+        camera_target = self.get_camera_target()
         
-        self.camera_position = self.camera_position.lerp(camera_target, min(1, 5 * dt)) # This isn't proper delta time scaling but it's fine
+        # Closes the same fraction of the distance per second however long the step is
+        self.camera_position = self.camera_position.lerp(camera_target, 1 - math.exp(-CAMERA_FOLLOW_SPEED * dt))
 
         # Update day cycle
         cycle_length = DAY_LENGTH + NIGHT_LENGTH
@@ -109,6 +128,10 @@ class PlayingGameScene(GameScene):
         self.day_cycle_time %= cycle_length
         
         is_day = self.day_cycle_time < DAY_LENGTH
+        # Start loading the next track at dusk (or before dawn), so it's ready by the time it's needed. This runs
+        # every step, so if the scary nights start during dusk, the scary track is loaded instead
+        if self.day_cycle_time >= (DAY_LENGTH if is_day else cycle_length) - DUSK_DAWN_LENGTH:
+            self.game.audio_manager.prepare_track(self.get_upcoming_track())
         if is_day != self.was_day:
             self.was_day = is_day
             if is_day:
@@ -116,27 +139,35 @@ class PlayingGameScene(GameScene):
             else:
                 self.night_transition()
         
-        for entity in self.farm.entities:
-            entity.update(dt, self.farm)
+        with frame_timer.section("entity update"):
+            self.farm.update_entities(dt)
+
+    def get_playing_track(self: Self, is_day: bool) -> str:
+        audio_manager = self.game.audio_manager
+        if is_day:
+            return audio_manager.day_track
+        if self.scary_night_occurances_started:
+            return audio_manager.scary_night_track
+        return audio_manager.night_track
+
+    def get_upcoming_track(self: Self) -> str:
+        """The track the next day or night transition will play, going by what's happened so far."""
+        return self.get_playing_track(not self.was_day)
 
     def update_playing_track(self: Self):
-        if self.was_day:
-            self.game.audio_manager.play_day_track()
-        else:
-            if self.scary_night_occurances_started:
-                self.game.audio_manager.play_scary_night_track()
-            else:
-                self.game.audio_manager.play_night_track()
+        self.game.audio_manager.play_track(self.get_playing_track(self.was_day))
 
     def day_transition(self: Self):
         """Called when the day starts"""
+        self.days_passed += 1
         self.update_playing_track()
         condition_state = self.game.dialogue_manager.condition_state
         if self.scary_night_occurances_started and not condition_state.has_event(WorldEvent.FirstScaryNightEnd):
             condition_state.add_event(WorldEvent.FirstScaryNightEnd)
         
-        # Temporary, unoptimized; whatever for now
-        self.farm.entities = [entity for entity in self.farm.entities if not isinstance(entity, ShadowMachine)]
+        # Shadows far from the player may still be owed some of the night
+        self.farm.shadows.catch_up(self.farm)
+        self.farm.shadows.clear()
 
     def night_transition(self: Self):
         """Called when the night starts"""
@@ -147,8 +178,8 @@ class PlayingGameScene(GameScene):
                 condition_state.add_event(WorldEvent.FirstScaryNightStart)
         
             # TEMPORARY
-            for i in range(40):
-                self.farm.add_entity(ShadowMachine())
+            self.farm.flow_field.build()
+            self.farm.shadows.spawn(40, self.farm.rng)
 
     def get_daylight(self: Self):
         """Returns a value from 0 to 1 representing the current daylight. Throughout the entire night, this value is 0."""
@@ -164,11 +195,16 @@ class PlayingGameScene(GameScene):
     def draw(self: Self, win: pygame.Surface, inputs: Inputs):
         win.fill("#000000")
         
-        self.farm.draw(win, self.camera_position, self.game.player, self.selected_cell_x, self.selected_cell_y, self.selection_color, inputs.clicking, inputs.interacting)
+        # Everything is drawn part of the way between the last two simulation steps
+        interpolation = self.game.interpolation
+        camera_position = self.previous_camera_position.lerp(self.camera_position, interpolation)
+        
+        with frame_timer.section("map draw"):
+            self.farm.draw(win, camera_position, self.game.player, self.selected_cell_x, self.selected_cell_y, self.selection_color, inputs.clicking, inputs.interacting, interpolation)
         
         # Draw target crosshair
         if not CROSSHAIR_ONLY_WITH_JOYSTICK or not self.game.inputs.using_keyboard_input:
-            target_reference = self.get_target_reference()
+            target_reference = self.game.player.get_draw_pos(interpolation) - camera_position + pygame.Vector2(get_width() // 2, get_height() // 2)
             pygame.draw.line(
                 win, CROSSHAIR_COLOR,
                 (target_reference.x + self.target_x - CROSSHAIR_SIZE, target_reference.y + self.target_y),
@@ -182,10 +218,12 @@ class PlayingGameScene(GameScene):
                 width=CROSSHAIR_THICKNESS
             )
         
-        draw_particles(win, self.camera_position)
-        self.game.player.draw_player(win, self.camera_position)
+        with frame_timer.section("particle draw"):
+            draw_particles(win, camera_position)
+        self.game.player.draw_player(win, camera_position, interpolation)
         
-        self.farm.draw_front_of_player(win, self.camera_position, self.game.player, inputs.interacting)
+        with frame_timer.section("map draw"):
+            self.farm.draw_front_of_player(win, camera_position, self.game.player, inputs.interacting, interpolation)
         
         # Draw day fading
         if self.day_fade_surface.get_size() != (get_width(), get_height()):
@@ -196,22 +234,24 @@ class PlayingGameScene(GameScene):
         self.day_fade_surface.set_alpha(int((1 - brightness) * NIGHT_OPACITY))
         win.blit(self.day_fade_surface, (0, 0))
         
-        draw_floating_hint_texts(win, self.camera_position)
-        
-        self.game.player.draw_ui(win)
+        with frame_timer.section("floating text"):
+            draw_floating_hint_texts(win, camera_position)
         
-        if self.get_daylight() == 0 and self.scary_night_occurances_started:
-            # It's night... spooky
-            time_remaining = NIGHT_LENGTH - (self.day_cycle_time - DAY_LENGTH)
-            shake_amount = int(2 / max(0.5, time_remaining / NIGHT_LENGTH) + 0.5)
-            # Only works for <60 second nights, whatever for now
-            win.blit(
-                font := giant_font_render(f"00:{str(int(time_remaining)).rjust(2, '0')}", "red"),
-                (get_width() // 2 - font.get_width() // 2 + random.randint(-shake_amount, shake_amount), 15 + random.randint(-shake_amount,shake_amount))
-            )
-        
-        draw_currency(win, self.game.player)
-        draw_time(win, self.day_cycle_time)
+        with frame_timer.section("HUD"):
+            self.game.player.draw_ui(win)
+            
+            if self.get_daylight() == 0 and self.scary_night_occurances_started:
+                # It's night... spooky
+                time_remaining = NIGHT_LENGTH - (self.day_cycle_time - DAY_LENGTH)
+                shake_amount = int(2 / max(0.5, time_remaining / NIGHT_LENGTH) + 0.5)
+                # Only works for <60 second nights, whatever for now
+                win.blit(
+                    font := giant_font_render(f"00:{str(int(time_remaining)).rjust(2, '0')}", "red"),
+                    (get_width() // 2 - font.get_width() // 2 + effects_random.randint(-shake_amount, shake_amount), 15 + effects_random.randint(-shake_amount,shake_amount))
+                )
+            
+            draw_currency(win, self.game.player)
+            draw_time(win, self.day_cycle_time)
     
     def event_input(self: Self, type: InputType):
         if type.is_slot_select():
@@ -222,7 +262,7 @@ class PlayingGameScene(GameScene):
             return
         
         if type == InputType.CLICK_DOWN:
-            self.game.player.mouse_down()
+            self.game.player.mouse_down(self.game.inputs.mouse_x, self.game.inputs.mouse_y)
         
         if type == InputType.INTERACT_DOWN:
             interaction = self.farm.check_proximity_interaction(self.game.player)
@@ -1,9 +1,12 @@
 from functools import cache
+import random
 import pygame
-from constants import DEFAULT_WIDTH, DEFAULT_HEIGHT, TOOLTIP_BACKGROUND_COLOR, TOOLTIP_BORDER_RADIUS, TOOLTIP_LINE_SPACING, TOOLTIP_PADDING, TOOLTIP_WINDOW_MARGIN
+from bundles import open_asset
+from constants import DEFAULT_WIDTH, DEFAULT_HEIGHT, TEXT_CACHE_BUDGET, TOOLTIP_BACKGROUND_COLOR, TOOLTIP_BORDER_RADIUS, TOOLTIP_LINE_SPACING, TOOLTIP_PADDING, TOOLTIP_WINDOW_MARGIN
+from graphics.text_cache import TextCache
 from utils import get_asset, is_web
 
-GIANT_FONT = pygame.font.Font(get_asset("NotoSans-SemiBold.ttf"), 96)
+GIANT_FONT = pygame.font.Font(open_asset(get_asset("NotoSans-SemiBold.ttf")), 96)
 BIG_FONT = pygame.font.SysFont("Consolas", 30)
 FONT = pygame.font.SysFont("Consolas", 24)
 SMALL_FONT = pygame.font.SysFont("Consolas", 20)
@@ -13,6 +16,17 @@ if is_web():
 else:
     WIN = pygame.display.set_mode((DEFAULT_WIDTH, DEFAULT_HEIGHT), pygame.RESIZABLE, vsync=1)
 
+# Randomness for purely visual effects (particles, shaking, ...). It's kept separate from the global random
+# module so that what gets drawn never changes the outcome of the simulation, e.g. when replaying inputs.
+effects_random = random.Random()
+
+def set_window_size(width: int, height: int, resizable: bool = True):
+    """Resizes the window. WIN stays the same surface."""
+    if is_web():
+        pygame.display.set_mode((width, height))
+    else:
+        pygame.display.set_mode((width, height), pygame.RESIZABLE if resizable else 0, vsync=1)
+
 def get_width():
     """Get the current width of the window."""
     return WIN.get_width()
@@ -20,18 +34,18 @@ def get_height():
     """Get the current height of the window."""
     return WIN.get_height()
 
-@cache
+# Shared by all the font render functions; text like the currency and clock changes all the time,
+# so this has to be bounded
+text_cache = TextCache(TEXT_CACHE_BUDGET)
+
 def small_font_render(text, color='white'):
-    return SMALL_FONT.render(text, True, color)
-@cache
+    return text_cache.get(SMALL_FONT, text, color)
 def normal_font_render(text, color='white'):
-    return FONT.render(text, True, color)
-@cache
+    return text_cache.get(FONT, text, color)
 def big_font_render(text, color='white'):
-    return BIG_FONT.render(text, True, color)
-@cache
+    return text_cache.get(BIG_FONT, text, color)
 def giant_font_render(text, color='white'):
-    return GIANT_FONT.render(text, True, color)
+    return text_cache.get(GIANT_FONT, text, color)
 
 @cache
 def make_transparent_rect_surface(color: tuple[int, int, int], rect: tuple[int, int, int, int], alpha: int, border_radius: int = 0):
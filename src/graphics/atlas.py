@@ -0,0 +1,85 @@
+"""
+Packs the small static sprites (terrain, plants, walls, selectors and items) into a few large surfaces, so
+drawing them is a matter of blitting a rect of one of those pages. That keeps the pixels of sprites that
+are drawn together close in memory, and lets a whole layer of them be drawn with a single blits call:
+
+    blits.append((sprite.page, (x, y), sprite.rect))
+
+Sprites are added the first time they're used, with a simple shelf packer: they're placed left to right
+in rows as tall as the tallest sprite in them, and a new page is started when one fills up.
+"""
+
+from typing import Hashable
+
+import pygame
+
+from assets import Asset
+from constants import ATLAS_PAGE_SIZE
+
+class AtlasSprite:
+    page: pygame.Surface
+    rect: pygame.Rect
+
+    def __init__(self, page: pygame.Surface, rect: pygame.Rect):
+        self.page = page
+        self.rect = rect
+
+    def draw(self, win: pygame.Surface, pos: tuple[float, float]):
+        win.blit(self.page, pos, self.rect)
+
+class TextureAtlas:
+    page_size: int
+    pages: list[pygame.Surface]
+    sprites: dict[Hashable, AtlasSprite]
+    frames: dict[Hashable, list[AtlasSprite]]
+
+    # Where the next sprite goes on the last page
+    shelf_x: int = 0
+    shelf_y: int = 0
+    shelf_height: int = 0
+
+    def __init__(self, page_size: int):
+        self.page_size = page_size
+        self.pages = []
+        self.sprites = {}
+        self.frames = {}
+
+    def new_page(self):
+        page = pygame.Surface((self.page_size, self.page_size), pygame.SRCALPHA).convert_alpha()
+        page.fill((0, 0, 0, 0))
+        self.pages.append(page)
+        self.shelf_x = self.shelf_y = self.shelf_height = 0
+
+    def add(self, surface: pygame.Surface) -> AtlasSprite:
+        width, height = surface.get_size()
+        if width > self.page_size or height > self.page_size:
+            # Doesn't fit on a page, so it gets one to itself
+            return AtlasSprite(surface, surface.get_rect())
+
+        if not self.pages or self.shelf_x + width > self.page_size:
+            self.shelf_x = 0
+            self.shelf_y += self.shelf_height
+            self.shelf_height = 0
+        if not self.pages or self.shelf_y + height > self.page_size:
+            self.new_page()
+
+        rect = pygame.Rect(self.shelf_x, self.shelf_y, width, height)
+        # Adding to the page's transparent pixels copies the sprite exactly, where a normal blit would blend it
+        self.pages[-1].blit(surface, rect, special_flags=pygame.BLEND_RGBA_ADD)
+        self.shelf_x += width
+        self.shelf_height = max(self.shelf_height, height)
+        return AtlasSprite(self.pages[-1], rect)
+
+    def get_image(self, asset: Asset[pygame.Surface]) -> AtlasSprite:
+        sprite = self.sprites.get(asset.key)
+        if sprite is None:
+            sprite = self.sprites[asset.key] = self.add(asset.get())
+        return sprite
+
+    def get_frames(self, asset: Asset[list[pygame.Surface]]) -> list[AtlasSprite]:
+        frames = self.frames.get(asset.key)
+        if frames is None:
+            frames = self.frames[asset.key] = [self.add(surface) for surface in asset.get()]
+        return frames
+
+sprite_atlas = TextureAtlas(ATLAS_PAGE_SIZE)
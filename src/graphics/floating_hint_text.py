@@ -2,6 +2,7 @@ from typing import Literal
 import pygame
 
 from graphics import get_height, get_width
+import sim_clock
 
 class FloatingHintText:
     start_time: float
@@ -23,7 +24,7 @@ class FloatingHintText:
         alignment="center"
     ):
         from graphics import small_font_render
-        self.start_time = pygame.time.get_ticks() / 1000 # Seconds
+        self.start_time = sim_clock.get_ticks() / 1000 # Seconds
         sfr = small_font_render(text, color)
         self.surface = pygame.Surface((sfr.get_width() + 2, sfr.get_height() + 2), pygame.SRCALPHA)
         self.surface.blit(small_font_render(text, 'black'), (2, 2))
@@ -39,11 +40,11 @@ class FloatingHintText:
     def is_complete(self):
         if self.manually_finished:
             return True
-        time = pygame.time.get_ticks() / 1000
+        time = sim_clock.get_ticks() / 1000
         elapsed = time - self.start_time
         return elapsed > self.stay_time + self.fade_time
     def draw(self, win: pygame.Surface, camera_pos: tuple[int, int]):
-        time = pygame.time.get_ticks() / 1000
+        time = sim_clock.get_ticks() / 1000
         elapsed = time - self.start_time
         offset = 0
         if self.alignment == "center":
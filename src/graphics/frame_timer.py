@@ -0,0 +1,172 @@
+"""
+Measures how long each part of a frame takes and draws it as an overlay (toggled with F3), so stutter can be
+traced to a subsystem without attaching a profiler. Wrap code in frame_timer.section("name"); sections can be
+nested and the overlay indents them accordingly.
+"""
+
+import time
+from typing import Self
+
+import numpy as np
+import pygame
+
+from audio import sound_cache
+from constants import FRAME_TIMER_GRAPH_MAX_MS, FRAME_TIMER_HISTORY, FRAME_TIMER_OVERLAY_REFRESH
+from graphics import SMALL_FONT, text_cache, transparent_rect
+
+OVERLAY_MARGIN = 10
+# Leaves room for the currency display in the top left
+OVERLAY_TOP = 50
+OVERLAY_PADDING = 8
+GRAPH_HEIGHT = 60
+GRAPH_COLOR = (120, 220, 120)
+SLOW_FRAME_COLOR = (230, 90, 90)
+GUIDE_COLOR = (90, 90, 90)
+# Frames slower than this are drawn in red on the graph
+SLOW_FRAME_MS = 1000 / 60
+
+class TimedSection:
+    """A reusable context manager that adds the time spent inside it to its section of the current frame."""
+    timer: "FrameTimer"
+    name: str
+    start: float = 0
+
+    def __init__(self, timer: "FrameTimer", name: str):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self: Self) -> Self:
+        self.timer.depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        elapsed = time.perf_counter() - self.start
+        self.timer.depth -= 1
+        self.timer.current[self.name] = self.timer.current.get(self.name, 0) + elapsed
+
+class FrameTimer:
+    visible: bool = False
+
+    # Ring buffers of the last FRAME_TIMER_HISTORY frames, in seconds
+    frame_times: np.ndarray
+    section_times: dict[str, np.ndarray]
+    # Nesting depth of each section, in the order they were first seen
+    section_depths: dict[str, int]
+    sections: dict[str, TimedSection]
+    frame_count: int = 0
+
+    current: dict[str, float]
+    depth: int = 0
+    frame_start: float = 0
+
+    overlay: pygame.Surface | None = None
+    last_overlay_refresh: float = 0
+
+    def __init__(self):
+        self.frame_times = np.zeros(FRAME_TIMER_HISTORY)
+        self.section_times = {}
+        self.section_depths = {}
+        self.sections = {}
+        self.current = {}
+
+    def section(self, name: str) -> TimedSection:
+        section = self.sections.get(name)
+        if section is None:
+            section = self.sections[name] = TimedSection(self, name)
+            self.section_times[name] = np.zeros(FRAME_TIMER_HISTORY)
+            self.section_depths[name] = self.depth
+        return section
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.overlay = None
+
+    def begin_frame(self):
+        self.frame_start = time.perf_counter()
+
+    def end_frame(self):
+        index = self.frame_count % FRAME_TIMER_HISTORY
+        self.frame_times[index] = time.perf_counter() - self.frame_start
+        for name, times in self.section_times.items():
+            times[index] = self.current.get(name, 0)
+        self.current.clear()
+        self.frame_count += 1
+
+    def get_history(self, times: np.ndarray) -> np.ndarray:
+        """Returns the recorded part of a ring buffer, oldest first."""
+        if self.frame_count < FRAME_TIMER_HISTORY:
+            return times[:self.frame_count]
+        return np.roll(times, -(self.frame_count % FRAME_TIMER_HISTORY))
+
+    def render_overlay(self) -> pygame.Surface:
+        rows = [["", "p50", "p95", "p99 ms"]]
+        names = ["frame"] + list(self.section_times.keys())
+        all_times = [self.get_history(self.frame_times)] + [self.get_history(times) for times in self.section_times.values()]
+        for name, times in zip(names, all_times):
+            p50, p95, p99 = np.percentile(times, [50, 95, 99]) * 1000
+            rows.append(["  " * self.section_depths.get(name, 0) + name, f"{p50:.2f}", f"{p95:.2f}", f"{p99:.2f}"])
+
+        rows.append([
+            "text cache",
+            f"{len(text_cache)}",
+            f"{text_cache.used_bytes / 1024:.0f}KB",
+            f"{text_cache.get_hit_rate() * 100:.0f}% hits"
+        ])
+        rows.append([
+            "sound cache",
+            f"{len(sound_cache)}",
+            f"{sound_cache.used_bytes / 1024:.0f}KB",
+            f"{sound_cache.get_hit_rate() * 100:.0f}% hits"
+        ])
+
+        # The font isn't necessarily monospace, so lay the text out as a table with right-aligned numbers
+        rendered = [[SMALL_FONT.render(cell, True, "white") for cell in row] for row in rows]
+        column_widths = [max(row[column].get_width() for row in rendered) + OVERLAY_PADDING for column in range(len(rows[0]))]
+        row_height = SMALL_FONT.get_linesize()
+        surface = pygame.Surface((sum(column_widths), row_height * len(rows)), pygame.SRCALPHA)
+        for row_index, row in enumerate(rendered):
+            x = 0
+            for column, cell in enumerate(row):
+                if column == 0:
+                    surface.blit(cell, (x, row_index * row_height))
+                else:
+                    surface.blit(cell, (x + column_widths[column] - cell.get_width(), row_index * row_height))
+                x += column_widths[column]
+        return surface
+
+    def draw_graph(self, win: pygame.Surface, x: int, y: int, width: int):
+        frame_times = self.get_history(self.frame_times)[-width:] * 1000
+
+        for guide_ms in (1000 / 60, 1000 / 30):
+            guide_y = y + GRAPH_HEIGHT - GRAPH_HEIGHT * guide_ms / FRAME_TIMER_GRAPH_MAX_MS
+            pygame.draw.line(win, GUIDE_COLOR, (x, guide_y), (x + width, guide_y))
+
+        bottom = y + GRAPH_HEIGHT
+        start_x = x + width - len(frame_times)
+        for i, frame_ms in enumerate(frame_times):
+            bar_height = min(GRAPH_HEIGHT, GRAPH_HEIGHT * frame_ms / FRAME_TIMER_GRAPH_MAX_MS)
+            color = SLOW_FRAME_COLOR if frame_ms > SLOW_FRAME_MS else GRAPH_COLOR
+            pygame.draw.line(win, color, (start_x + i, bottom), (start_x + i, bottom - bar_height))
+
+    def draw(self, win: pygame.Surface):
+        if self.frame_count == 0:
+            return
+
+        # Re-rendering the text every frame would be both slow and unreadable
+        now = time.perf_counter()
+        if self.overlay is None or now - self.last_overlay_refresh > FRAME_TIMER_OVERLAY_REFRESH:
+            self.overlay = self.render_overlay()
+            self.last_overlay_refresh = now
+
+        # Rounded so the background size doesn't change with every refresh, since those surfaces are cached
+        width = -(-self.overlay.get_width() // 32) * 32
+        height = self.overlay.get_height() + OVERLAY_PADDING + GRAPH_HEIGHT
+        transparent_rect(win, (0, 0, 0), (OVERLAY_MARGIN, OVERLAY_TOP, width + OVERLAY_PADDING * 2, height + OVERLAY_PADDING * 2), 180)
+
+        x = OVERLAY_MARGIN + OVERLAY_PADDING
+        y = OVERLAY_TOP + OVERLAY_PADDING
+        win.blit(self.overlay, (x, y))
+        self.draw_graph(win, x, y + self.overlay.get_height() + OVERLAY_PADDING, width)
+
+frame_timer = FrameTimer()
@@ -1,59 +1,194 @@
+from collections import OrderedDict
+
+import numpy as np
 import pygame
-import random
+
+from constants import PARTICLE_CAPACITY, PARTICLE_SPRITE_CACHE_SIZE
 from graphics import get_height, get_width
 
-class Particle:
-    def __init__(self, x, y, color):
-        self.pos = pygame.Vector2(x, y)
-        self.color = color
-        self.lifetime = 1 + random.random() * 0.5
-        self.angle = random.random() * 360
-        self.rot_speed = random.randint(-720, 720)
-        self.speed = random.randint(35, 70)
-        self.size = random.randint(2, 5)
-        self.timer = 0
-        self.done = False
-
-    def draw(self, win, offset):
-        s = pygame.Surface((self.size, self.size), pygame.SRCALPHA)
-        s.fill(self.color)
-        s.set_alpha(255 * (1 - (self.timer / self.lifetime)))
-        s = pygame.transform.rotate(s, self.angle)
-
-        p = self.pos + pygame.Vector2(get_width()//2, get_height()//2) - offset
-
-        win.blit(s, p)
-    
-    def update(self, delta):
-        self.timer += delta
-        if self.timer >= self.lifetime:
-            self.done = True
-        self.angle += self.rot_speed * delta
-        self.pos.y -= self.speed * delta
-
-particles: list[Particle] = []
+# Particles are purely visual, so they have their own generator; see effects_random
+rng = np.random.default_rng()
+
+# Particles are squares, so rotations only need to cover 90 degrees
+SPRITE_ANGLE_STEPS = 18
+SPRITE_ALPHA_STEPS = 16
+# Exclusive; bigger particles are shrunk to fit
+MAX_PARTICLE_SIZE = 8
+
+class ParticleSpriteCache:
+    """
+    Rotated, faded particle sprites, keyed by color, size, quantized angle and quantized alpha.
+    Sprites are made the first time they're needed, and the least recently used ones are evicted past max_size.
+    """
+    max_size: int
+    sprites: OrderedDict[int, pygame.Surface]
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.sprites = OrderedDict()
+
+    @staticmethod
+    def get_keys(color_index: np.ndarray, size: np.ndarray, angle: np.ndarray, alpha: np.ndarray) -> np.ndarray:
+        angle_step = (angle % 90 * (SPRITE_ANGLE_STEPS / 90)).astype(np.int64) % SPRITE_ANGLE_STEPS
+        alpha_step = np.clip(alpha * (SPRITE_ALPHA_STEPS / 256), 0, SPRITE_ALPHA_STEPS - 1).astype(np.int64)
+        return ((color_index.astype(np.int64) * MAX_PARTICLE_SIZE + size) * SPRITE_ANGLE_STEPS + angle_step) * SPRITE_ALPHA_STEPS + alpha_step
+
+    def get_sprite(self, key: int, colors: list[pygame.Color]) -> pygame.Surface:
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.sprites.move_to_end(key)
+            return sprite
+
+        rest, alpha_step = divmod(key, SPRITE_ALPHA_STEPS)
+        rest, angle_step = divmod(rest, SPRITE_ANGLE_STEPS)
+        color_index, size = divmod(rest, MAX_PARTICLE_SIZE)
+
+        sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+        sprite.fill(colors[color_index])
+        sprite.set_alpha(int((alpha_step + 0.5) * (256 / SPRITE_ALPHA_STEPS)))
+        sprite = pygame.transform.rotate(sprite, angle_step * (90 / SPRITE_ANGLE_STEPS))
+
+        self.sprites[key] = sprite
+        if len(self.sprites) > self.max_size:
+            self.sprites.popitem(last=False)
+        return sprite
+
+class ParticlePool:
+    """
+    A fixed-capacity pool of particles stored as arrays, so updating them is a handful of vectorized operations.
+    Live particles are packed at the start of the arrays; dead ones are replaced by live ones from the end.
+    """
+    capacity: int
+    count: int = 0
+
+    x: np.ndarray
+    y: np.ndarray
+    velocity_x: np.ndarray
+    velocity_y: np.ndarray
+    angle: np.ndarray # Degrees
+    spin: np.ndarray # Degrees per second
+    age: np.ndarray # Seconds
+    lifetime: np.ndarray # Seconds
+    size: np.ndarray # Pixels
+    color_index: np.ndarray
+
+    # Colors are stored as indices into this palette, which grows as new colors are used
+    colors: list[pygame.Color]
+    color_indices: dict[str, int]
+
+    sprite_cache: ParticleSpriteCache
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.velocity_x = np.zeros(capacity, dtype=np.float32)
+        self.velocity_y = np.zeros(capacity, dtype=np.float32)
+        self.angle = np.zeros(capacity, dtype=np.float32)
+        self.spin = np.zeros(capacity, dtype=np.float32)
+        self.age = np.zeros(capacity, dtype=np.float32)
+        self.lifetime = np.zeros(capacity, dtype=np.float32)
+        self.size = np.zeros(capacity, dtype=np.uint8)
+        self.color_index = np.zeros(capacity, dtype=np.uint16)
+
+        self.colors = []
+        self.color_indices = {}
+
+        self.sprite_cache = ParticleSpriteCache(PARTICLE_SPRITE_CACHE_SIZE)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get_arrays(self) -> list[np.ndarray]:
+        return [self.x, self.y, self.velocity_x, self.velocity_y, self.angle, self.spin, self.age, self.lifetime, self.size, self.color_index]
+
+    def get_color_index(self, color: str) -> int:
+        index = self.color_indices.get(color)
+        if index is None:
+            index = self.color_indices[color] = len(self.colors)
+            self.colors.append(pygame.Color(color))
+        return index
+
+    def spawn(self, x: np.ndarray, y: np.ndarray, velocity_x: np.ndarray, velocity_y: np.ndarray, angle: np.ndarray,
+              spin: np.ndarray, lifetime: np.ndarray, size: np.ndarray, color: str):
+        """Adds particles from arrays of their properties. Particles that don't fit in the pool are dropped."""
+        num = min(len(x), self.capacity - self.count)
+        if num <= 0:
+            return
+
+        new = slice(self.count, self.count + num)
+        self.x[new] = x[:num]
+        self.y[new] = y[:num]
+        self.velocity_x[new] = velocity_x[:num]
+        self.velocity_y[new] = velocity_y[:num]
+        self.angle[new] = angle[:num]
+        self.spin[new] = spin[:num]
+        self.age[new] = 0
+        self.lifetime[new] = lifetime[:num]
+        self.size[new] = np.minimum(size[:num], MAX_PARTICLE_SIZE - 1)
+        self.color_index[new] = self.get_color_index(color)
+        self.count += num
+
+    def update(self, delta: float):
+        live = slice(0, self.count)
+        self.age[live] += delta
+        self.angle[live] += self.spin[live] * delta
+        self.x[live] += self.velocity_x[live] * delta
+        self.y[live] += self.velocity_y[live] * delta
+
+        dead = self.age[live] >= self.lifetime[live]
+        dead_count = int(np.count_nonzero(dead))
+        if dead_count == 0:
+            return
+
+        # Swap-remove: live particles past the new end fill the holes left by dead ones before it
+        new_count = self.count - dead_count
+        holes = np.flatnonzero(dead[:new_count])
+        movers = np.flatnonzero(~dead[new_count:]) + new_count
+        for array in self.get_arrays():
+            array[holes] = array[movers]
+        self.count = new_count
+
+    def draw(self, win: pygame.Surface, camera_pos: pygame.Vector2):
+        if self.count == 0:
+            return
+
+        live = slice(0, self.count)
+        screen_x = self.x[live] + (get_width() // 2 - camera_pos.x)
+        screen_y = self.y[live] + (get_height() // 2 - camera_pos.y)
+        # Rotated squares are at most sqrt(2) times their size
+        margin = 8
+        visible = np.flatnonzero((screen_x > -margin) & (screen_x < get_width()) & (screen_y > -margin) & (screen_y < get_height()))
+        if len(visible) == 0:
+            return
+        alphas = 255 * (1 - self.age[visible] / self.lifetime[visible])
+
+        keys = ParticleSpriteCache.get_keys(self.color_index[visible], self.size[visible], self.angle[visible], alphas)
+        unique_keys, sprite_indices = np.unique(keys, return_inverse=True)
+        sprites = [self.sprite_cache.get_sprite(key, self.colors) for key in unique_keys.tolist()]
+
+        win.fblits(zip(
+            [sprites[i] for i in sprite_indices.tolist()],
+            zip(screen_x[visible].tolist(), screen_y[visible].tolist())
+        ))
+
+particles = ParticlePool(PARTICLE_CAPACITY)
 
 def draw_particles(win, camera_pos):
-    global particles
-    for p in particles:
-        p.draw(win, camera_pos)
+    particles.draw(win, camera_pos)
 
 def update_particles(delta):
-    global particles
-    
-    i = 0
-    while i < len(particles):
-        particle = particles[i]
-        particle.update(delta)
-
-        if particle.done:
-            particles.pop(i)
-            i -= 1
-        i += 1
+    particles.update(delta)
 
 def spawn_particles_in_square(x, y, color, radius=5, num=1):
-    global particles
-    import random
-    particles += [
-        Particle(x + random.randint(-radius, radius), y + random.randint(-radius, radius), color) for _ in range(num)
-    ]
\ No newline at end of file
+    particles.spawn(
+        x + rng.integers(-radius, radius, endpoint=True, size=num),
+        y + rng.integers(-radius, radius, endpoint=True, size=num),
+        np.zeros(num),
+        -rng.integers(35, 70, endpoint=True, size=num),
+        rng.random(num) * 360,
+        rng.integers(-720, 720, endpoint=True, size=num),
+        1 + rng.random(num) * 0.5,
+        rng.integers(2, 5, endpoint=True, size=num),
+        color
+    )
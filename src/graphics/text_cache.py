@@ -0,0 +1,96 @@
+from collections import OrderedDict
+from typing import Hashable
+
+import pygame
+
+type TextKey = tuple[pygame.font.Font, str, Hashable]
+
+def get_surface_bytes(surface: pygame.Surface) -> int:
+    return surface.get_pitch() * surface.get_height()
+
+class TextCache:
+    """
+    Rendered text surfaces, keyed by font, text and color. The total size of the surfaces is kept under a byte
+    budget by evicting the least recently used ones. Pinned entries are never evicted, but count toward the budget.
+    """
+    budget_bytes: int
+    used_bytes: int = 0
+
+    entries: OrderedDict[TextKey, pygame.Surface]
+    pinned: dict[TextKey, pygame.Surface]
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self.entries = OrderedDict()
+        self.pinned = {}
+
+    def __len__(self) -> int:
+        return len(self.entries) + len(self.pinned)
+
+    def get(self, font: pygame.font.Font, text: str, color) -> pygame.Surface:
+        key = (font, text, color)
+        surface = self.pinned.get(key)
+        if surface is not None:
+            self.hits += 1
+            return surface
+
+        surface = self.entries.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, True, color)
+        size = get_surface_bytes(surface)
+        if size > self.budget_bytes:
+            # Caching it would evict everything else
+            return surface
+
+        self.entries[key] = surface
+        self.used_bytes += size
+        self.evict()
+        return surface
+
+    def evict(self):
+        while self.used_bytes > self.budget_bytes and self.entries:
+            _, surface = self.entries.popitem(last=False)
+            self.used_bytes -= get_surface_bytes(surface)
+            self.evictions += 1
+
+    def pin(self, font: pygame.font.Font, text: str, color) -> pygame.Surface:
+        """Renders the text if needed and keeps it cached until it's unpinned."""
+        key = (font, text, color)
+        surface = self.pinned.get(key)
+        if surface is not None:
+            return surface
+
+        surface = self.entries.pop(key, None)
+        if surface is None:
+            surface = font.render(text, True, color)
+            self.used_bytes += get_surface_bytes(surface)
+        self.pinned[key] = surface
+        self.evict()
+        return surface
+
+    def unpin(self, font: pygame.font.Font, text: str, color):
+        """Makes a pinned entry evictable again."""
+        key = (font, text, color)
+        surface = self.pinned.pop(key, None)
+        if surface is not None:
+            self.entries[key] = surface
+            self.evict()
+
+    def clear(self):
+        """Drops every entry that isn't pinned."""
+        for surface in self.entries.values():
+            self.used_bytes -= get_surface_bytes(surface)
+        self.entries.clear()
+
+    def get_hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
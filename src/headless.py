@@ -0,0 +1,97 @@
+"""
+Runs the game's simulation without a window, as fast as the CPU allows.
+Useful for soak tests, balance runs and benchmarking on machines without a display.
+
+Usage: python ./src/headless.py [--days 100] [--step 0.75] [--plant] [--scary-nights]
+"""
+
+import argparse
+import os
+import time
+
+# These have to be set before pygame is initialized
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+pygame.mixer.pre_init(44100, -16, 2, 512)
+pygame.init()
+
+from constants import FARMABLE_MAP_END, FARMABLE_MAP_START, MAP_UPDATE_RATE
+from game import Game
+from items import Item
+from map import Map
+from map.grid import StructureKind
+from map.tile import TileType
+import sim_clock
+
+def plant_farm(farm: Map, item: Item):
+    """Turns the whole farmable area (except water) into soil and plants it with the given seeds."""
+    grid = farm.grid
+    for x in range(FARMABLE_MAP_START[0], FARMABLE_MAP_END[0]):
+        for y in range(FARMABLE_MAP_START[1], FARMABLE_MAP_END[1]):
+            if grid.collidable[x, y]:
+                continue
+            grid.set_tile_type(x, y, TileType.SOIL.value, TileType.SOIL.collidable)
+            grid.set_structure(x, y, StructureKind.SOIL)
+            grid.crops[x, y] = item.value
+            grid.update_ticking(x, y)
+
+def run_headless(days: int, step: float, plant: bool = False, scary_nights: bool = False) -> dict[str, float]:
+    """
+    Simulates the given number of in-game days, advancing the simulation by one step of step seconds per frame.
+    Returns some statistics about the run.
+    """
+    sim_clock.use_simulated_time()
+
+    game = Game()
+    game.rendering = False
+    game.audio_manager.enabled = False
+    # Nothing is drawn, so each frame is a single step of the whole frame
+    game.sim_step = step
+
+    scene = game.playing_game_scene
+    scene.scary_night_occurances_started = scary_nights
+    if plant:
+        plant_farm(scene.farm, Item.CARROT_SEEDS)
+    game.start(scene)
+
+    frames = 0
+    start_time = time.perf_counter()
+    while scene.days_passed < days and not game.should_quit_game:
+        game.run(step)
+        frames += 1
+    elapsed = time.perf_counter() - start_time
+
+    # Regions far from the player may still be owed some growth
+    scene.farm.catch_up(game.dialogue_manager)
+    grid = scene.farm.grid
+    planted = (grid.structures == StructureKind.SOIL) & (grid.crops != 0)
+    return {
+        "days": scene.days_passed,
+        "frames": frames,
+        "simulated_seconds": sim_clock.get_ticks() / 1000,
+        "wall_seconds": elapsed,
+        "days_per_second": scene.days_passed / elapsed if elapsed > 0 else 0,
+        "frames_per_second": frames / elapsed if elapsed > 0 else 0,
+        "growing_crops": len(grid.ticking),
+        "fully_grown_crops": int(planted.sum()) - len(grid.ticking),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the game simulation headless with accelerated time.")
+    parser.add_argument("--days", type=int, default=100, help="Number of in-game days to simulate")
+    parser.add_argument("--step", type=float, default=MAP_UPDATE_RATE / 1000, help="Simulated seconds per frame")
+    parser.add_argument("--plant", action="store_true", help="Plant carrots on the whole farm before starting")
+    parser.add_argument("--scary-nights", action="store_true", help="Spawn shadows every night")
+    args = parser.parse_args()
+
+    stats = run_headless(args.days, args.step, args.plant, args.scary_nights)
+    for name, value in stats.items():
+        print(f"{name}: {value:.2f}" if isinstance(value, float) else f"{name}: {value}")
+
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -36,6 +36,8 @@ class InputType(Enum):
     
     CANCEL = auto() # ESC for keyboard, B for controller
     
+    TOGGLE_FRAME_TIMER = auto() # F3 for keyboard
+    
     def get_slot_index(self, current_slot: int, slot_count: int) -> int:
         if self == InputType.INVENTORY_SCROLL_UP:
             return max(1, min(slot_count, current_slot - 1))
@@ -82,6 +84,8 @@ class InputType(Enum):
                 return InputType.ALTERNATE_CLICK_DOWN if down else InputType.ALTERNATE_CLICK_UP
             case pygame.K_ESCAPE:
                 return InputType.CANCEL
+            case pygame.K_F3:
+                return InputType.TOGGLE_FRAME_TIMER if down else None
             case pygame.K_e | pygame.K_z | pygame.K_SPACE:
                 return InputType.INTERACT_DOWN if down else InputType.INTERACT_UP
             case _:
@@ -128,6 +132,11 @@ class Inputs:
     # and the mouse when using keyboard input
     target_x: float
     target_y: float
+    
+    # Game logic should read the mouse position from here instead of pygame.mouse,
+    # so replayed inputs can provide it
+    mouse_x: int = 0
+    mouse_y: int = 0
 
     clicking: bool = False
     interacting: bool = False
@@ -152,6 +161,8 @@ class Inputs:
         self.using_keyboard_input = len(self.joysticks) == 0
     
     def update(self: Self, target_reference: pygame.Vector2 = pygame.Vector2(get_width() // 2, get_height() // 2)):
+        self.mouse_x, self.mouse_y = pygame.mouse.get_pos()
+        
         if self.using_keyboard_input:
             self.movement_x = 0
             self.movement_y = 0
@@ -165,9 +176,8 @@ class Inputs:
             if keys[pygame.K_d] or keys[pygame.K_RIGHT]:
                 self.movement_x += 1
             
-            mouse_x, mouse_y = pygame.mouse.get_pos()
-            self.target_x = mouse_x - target_reference.x
-            self.target_y = mouse_y - target_reference.y
+            self.target_x = self.mouse_x - target_reference.x
+            self.target_y = self.mouse_y - target_reference.y
         else:
             joystick = self.joysticks[0]
             self.movement_x = deadzone(joystick.get_axis(pygame.CONTROLLER_AXIS_LEFTX))
@@ -183,6 +193,22 @@ class Inputs:
         movement_mag = math.sqrt(self.movement_x ** 2 + self.movement_y ** 2)
         self.movement_x = self.movement_x / movement_mag if movement_mag > 1 else self.movement_x
         self.movement_y = self.movement_y / movement_mag if movement_mag > 1 else self.movement_y
-        
+    
+    def end_step(self):
+        """Called after each simulation step, so a click is seen by exactly one step however many a frame runs."""
         if self.click_rising_edge and self.clicking:
-            self.click_rising_edge = False
\ No newline at end of file
+            self.click_rising_edge = False
+    
+    def get_state(self) -> tuple[float, float, float, float, int, int, bool, bool, bool]:
+        """Returns everything the game reads from the inputs in a frame, for recording."""
+        return (
+            self.movement_x, self.movement_y, self.target_x, self.target_y, self.mouse_x, self.mouse_y,
+            self.clicking, self.interacting, self.click_rising_edge
+        )
+    
+    def set_state(self, state: tuple[float, float, float, float, int, int, bool, bool, bool]):
+        """Restores a state returned by get_state instead of reading the input devices."""
+        (
+            self.movement_x, self.movement_y, self.target_x, self.target_y, self.mouse_x, self.mouse_y,
+            self.clicking, self.interacting, self.click_rising_edge
+        ) = state
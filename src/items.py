@@ -1,11 +1,11 @@
 from enum import Enum
 from typing import Optional
 import pygame
+from assets import Asset, asset_manager
 import graphics
 from graphics import get_width, get_height
 from constants import ITEM_SLOT_BORDER_RADIUS, ITEM_SLOT_ITEM_SIZE, ITEM_SLOT_MARGIN, ITEM_SLOT_PADDING, SLOT_BACKGROUND, SLOT_BACKGROUND_SELECTED
-
-from utils import get_asset
+from graphics.atlas import sprite_atlas
 
 class ItemShopData:
     buy_price: Optional[int]
@@ -37,7 +37,7 @@ class Item(Enum):
     WATERING_CAN_EMPTY = ("watering_can_sprite.png",      "Watering Can", True,  None,                   "Can be used to water crops when\nfilled with water.")
     WATERING_CAN_FULL =  ("watering_can_full_sprite.png", "Watering Can", True,  None,                   "Can be used to water crops.")
     
-    image: pygame.Surface
+    image_asset: Asset[pygame.Surface]
     path: str
     item_name: str
     interactable: bool
@@ -52,9 +52,7 @@ class Item(Enum):
         return obj
     def __init__(self, path: str, item_name: str, interactable: bool, shop_data: Optional[ItemShopData], description: str):
         self.path = path
-        original_image = pygame.image.load(get_asset("sprites", path)).convert_alpha()
-        image = pygame.transform.scale(original_image, (ITEM_SLOT_ITEM_SIZE, ITEM_SLOT_ITEM_SIZE))
-        self.image = image
+        self.image_asset = asset_manager.image("sprites", path, size=(ITEM_SLOT_ITEM_SIZE, ITEM_SLOT_ITEM_SIZE))
         
         self.item_name = item_name
         self.interactable = interactable
@@ -96,7 +94,7 @@ def render_item_slot(win: pygame.Surface, item: Item, quantity: int, selected: b
         border_radius=ITEM_SLOT_BORDER_RADIUS
     )
 
-    win.blit(item.image, (x + ITEM_SLOT_PADDING, y + ITEM_SLOT_PADDING))
+    sprite_atlas.get_image(item.image_asset).draw(win, (x + ITEM_SLOT_PADDING, y + ITEM_SLOT_PADDING))
 
     if quantity != 1:
         win.blit(
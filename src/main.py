@@ -2,14 +2,17 @@
 # dependencies = [
 #  "pygame",
 #  "perlin_noise",
+#  "numpy",
 # ]
 # ///
+import argparse
 import asyncio
 import pygame
 import perlin_noise
 
 import platform
 import sys
+import time
 
 if platform.system() == "Windows":
     import ctypes
@@ -22,27 +25,72 @@ import constants
 from game import Game
 from game_scene.main_menu import MainMenuScene
 from ui import *
+from assets import asset_manager
+from replay import InputRecorder, InputReplayer, seed_game
+from graphics import get_height, get_width, set_window_size
+import sim_clock
 
 game = Game()
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=constants.GAME_NAME)
+    parser.add_argument("--record", metavar="FILE", help="Record all inputs to a file so the session can be replayed")
+    parser.add_argument("--replay", metavar="FILE", help="Replay a recorded session instead of reading inputs")
+    parser.add_argument("--frame-times", metavar="FILE", help="When replaying, write each frame's time in milliseconds to a file")
+    # Unknown arguments are ignored, e.g. the ones the web runtime passes
+    return parser.parse_known_args()[0]
+
 async def main():
     global game
     
+    args = parse_args()
+    if args.replay:
+        game.replayer = InputReplayer(args.replay)
+        seed_game(game, game.replayer.seed)
+    elif args.record:
+        game.recorder = InputRecorder(args.record, (get_width(), get_height()))
+        seed_game(game, game.recorder.seed)
+    
+    if game.replayer is not None or game.recorder is not None:
+        # The UI is laid out for the window's size, so it's kept at the recorded size; see replay.py
+        window_size = game.replayer.window_size if game.replayer is not None else game.recorder.window_size
+        set_window_size(*window_size, resizable=False)
+        # How long loading takes mustn't change which frame the game starts on
+        asset_manager.load_all()
+    else:
+        # The main menu doesn't need any of these, so they load in the background while it's shown
+        asset_manager.request_all()
+    # The simulation runs in fixed steps, and its clock moves with them
+    sim_clock.use_simulated_time()
     game.start(MainMenuScene(game))
 
     clock = pygame.time.Clock()
     while not game.should_quit_game:
         current_monitor_refresh_rate = pygame.display.get_current_refresh_rate()
         delta = clock.tick_busy_loop(current_monitor_refresh_rate) / 1000 # Fixes stuttering for some reason
-        delta = min(delta, 1 / 30) # Prevents weird issues if, for example, the window is moved and the main thread is blocked
+        # Long frames (e.g. when the window is moved and the main thread is blocked) only run up to
+        # MAX_SIM_STEPS_PER_FRAME simulation steps, so the game keeps up with real time until then
 
         if delta:
             pygame.display.set_caption(f"{constants.GAME_NAME} | {(1.0 / delta):.2f}fps")
         
+        frame_start = time.perf_counter()
         game.run(delta)
+        if game.replayer is not None:
+            game.replayer.frame_times.append(time.perf_counter() - frame_start)
         
         await asyncio.sleep(0)
 
+    if game.recorder is not None:
+        game.recorder.close()
+        print(f"Recorded {game.recorder.frame_count} frames to {args.record}")
+    if game.replayer is not None:
+        game.replayer.close()
+        print(game.replayer.get_frame_time_summary())
+        if args.frame_times:
+            game.replayer.write_frame_times(args.frame_times)
+
+    asset_manager.shutdown()
     pygame.quit()
     sys.exit()
 
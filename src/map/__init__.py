@@ -1,103 +1,327 @@
+from collections import OrderedDict
 from perlin_noise import PerlinNoise
+import numpy as np
 import pygame
+from assets import Asset, asset_manager
 from audio import AudioManager
 from constants import FARMABLE_MAP_END, FARMABLE_MAP_START, INTERACTABLE_SELECTION_COLOR, NON_INTERACTABLE_SELECTION_COLOR, NOTHING_SELECTION_COLOR, TILE_SIZE
-import random
 import math
-from constants import MAP_WIDTH, MAP_HEIGHT, MAP_UPDATE_RATE, RANDOM_TICK_PER_UPDATE_RATIO
-from typing import TYPE_CHECKING, Callable
+from constants import ENTITY_HASH_CELL_SIZE, EXACT_RANDOM_TICK_STATISTICS, MAP_WIDTH, MAP_HEIGHT, MAP_UPDATE_RATE, RANDOM_TICK_PER_UPDATE_RATIO, SIM_REDUCED_MAP_UPDATES, SIM_REDUCED_STEP, SIM_REGION_SIZE, TERRAIN_CHUNK_CACHE_SIZE, TERRAIN_CHUNK_SIZE
+from typing import TYPE_CHECKING, Callable, Optional
 from dialogue import DialogueManager
 from graphics import get_height, get_width
+from graphics.atlas import AtlasSprite, sprite_atlas
 from items import Item
+import sim_clock
 from map.entity import Entity
-from map.tile import Tile, TileType
-from utils import get_asset
+from map.flow_field import FlowField
+from map.grid import TileGrid
+from map.shadow_swarm import ShadowSwarm
+from map.sim_lod import SimulationLOD
+from map.spatial_hash import SpatialHash
+from map.tile import SoilStructure, Tile, TileType
 
 if TYPE_CHECKING:
     from player import Player
 
+# Lookup tables between tile type values stored in the grid and tile layers
+LAYER_BY_TILE_TYPE = np.zeros(max(tile_type.value for tile_type in TileType) + 1, dtype=np.uint8)
+for tile_type in TileType:
+    LAYER_BY_TILE_TYPE[tile_type.value] = tile_type.layer
+TILE_TYPE_BY_LAYER = sorted(TileType, key=lambda tile_type: tile_type.layer)
+
+def compute_dual_grid(corner_types: np.ndarray) -> np.ndarray:
+    """
+    Takes the tile types at the corners of a block of dual-grid cells, shaped (cells_x + 1, cells_y + 1),
+    and returns the atlas index to draw for every layer of every cell, shaped (layers, cells_x, cells_y).
+    An atlas index of 0 means nothing is drawn for that layer.
+    """
+    # Since this is a dual-grid system, we perform the following steps:
+    # - Get the tile at each corner of the drawn tile position
+    # - Separate the tiles into 1-4 bitmasks--one per type of tile
+    # - Look up the bitmask with its tile type in the atlas, BUT draw the lowest layer as a full tile
+    corner_layers = [
+        LAYER_BY_TILE_TYPE[corner_types[:-1, :-1]],
+        LAYER_BY_TILE_TYPE[corner_types[1:, :-1]],
+        LAYER_BY_TILE_TYPE[corner_types[:-1, 1:]],
+        LAYER_BY_TILE_TYPE[corner_types[1:, 1:]]
+    ]
+    lowest_layer = np.minimum.reduce(corner_layers)
+    
+    bitmasks = np.zeros((len(TileType),) + lowest_layer.shape, dtype=np.uint8)
+    for layer in range(len(TileType)):
+        for i, layers in enumerate(corner_layers):
+            bitmasks[layer] |= (layers == layer).astype(np.uint8) << i
+        bitmasks[layer][lowest_layer == layer] = 0b1111
+    return bitmasks
+
 class Map:
-    last_map_update: float = 0
-    tiles: list[Tile]
+    # Milliseconds of updates since the last map update
+    map_update_time: float = 0
+    rng: np.random.Generator
+    # See EXACT_RANDOM_TICK_STATISTICS
+    exact_random_ticks: bool = EXACT_RANDOM_TICK_STATISTICS
+    width: int
+    height: int
+    grid: TileGrid
+    # In the order they were added, which is the order they're drawn in
     entities: list[Entity]
+    # For finding the entities near something without going through all of them
+    entity_hash: SpatialHash
+    shadows: ShadowSwarm
+    # Where shadows go to reach the crops; built at the start of each night
+    flow_field: FlowField
+    # How often each region of the map is simulated
+    lod: SimulationLOD
+    # Map updates each region's crops haven't been random ticked for yet, indexed [region_x, region_y]
+    owed_map_updates: np.ndarray
     
-    selection_images: dict[str, pygame.Surface] = {}
+    # Since terrain almost never changes, we cache the atlas index of every layer for every dual-grid cell
+    # whose corners touch the map. dual_grid[layer, cell_x + 1, cell_y + 1] is for the cell whose top-left
+    # corner is the tile (cell_x, cell_y), so the column and row before the map are included.
+    dual_grid: np.ndarray
     
-    def __init__(self):
-        self.tiles = []
+    # Pre-rendered terrain, keyed by chunk position. Each chunk covers TERRAIN_CHUNK_SIZE x TERRAIN_CHUNK_SIZE
+    # dual-grid cells and is dropped whenever one of its cells is patched, so it's re-rendered on next use.
+    terrain_chunks: OrderedDict[tuple[int, int], pygame.Surface]
+    
+    selection_images: dict[str, Asset[pygame.Surface]] = {}
+    
+    def __init__(self, width: int = MAP_WIDTH, height: int = MAP_HEIGHT):
+        self.width = width
+        self.height = height
+        self.rng = np.random.default_rng()
         
         for color in [NON_INTERACTABLE_SELECTION_COLOR, INTERACTABLE_SELECTION_COLOR, NOTHING_SELECTION_COLOR]:
             for variant in ["0", "1"]:
-                image = pygame.image.load(get_asset("ui", f"selector_{color}_{variant}.png")).convert_alpha()
-                image = pygame.transform.scale(image, (TILE_SIZE, TILE_SIZE * 17 // 16))
-                self.selection_images[f"{color}_{variant}"] = image
+                self.selection_images[f"{color}_{variant}"] = asset_manager.image("ui", f"selector_{color}_{variant}.png", size=(TILE_SIZE, TILE_SIZE * 17 // 16))
+        
+        self.grid = TileGrid(width, height, TileType.OUTSIDE_FARM_DIRT.value)
         
         noise = PerlinNoise(octaves=4, seed=100)
-        max_dim = max(MAP_WIDTH, MAP_HEIGHT)
-        for x in range(MAP_WIDTH):
-            for y in range(MAP_HEIGHT):
-                if x >= FARMABLE_MAP_START[0] and x < FARMABLE_MAP_END[0] and y >= FARMABLE_MAP_START[1] and y < FARMABLE_MAP_END[1]:
-                    val = noise.noise([x / max_dim, y / max_dim])
-                    self.tiles.append(Tile(TileType.GRASS if val > 0 else TileType.TALL_GRASS))
-                else:
-                    self.tiles.append(Tile(TileType.OUTSIDE_FARM_DIRT))
+        max_dim = max(width, height)
+        farm = self.grid.region(FARMABLE_MAP_START[0], FARMABLE_MAP_START[1], FARMABLE_MAP_END[0], FARMABLE_MAP_END[1])
+        for x in range(farm.width):
+            for y in range(farm.height):
+                val = noise.noise([(x + farm.x_offset) / max_dim, (y + farm.y_offset) / max_dim])
+                farm.tile_types[x, y] = TileType.GRASS.value if val > 0 else TileType.TALL_GRASS.value
 
-        WATER_POOL_START = (MAP_WIDTH // 4 - 2, MAP_HEIGHT // 2 - 2)
-        WATER_POOL_END = (MAP_WIDTH // 4 + 2, MAP_HEIGHT // 2 + 2)
-        for x in range(WATER_POOL_START[0], WATER_POOL_END[0]):
-            for y in range(WATER_POOL_START[1], WATER_POOL_END[1]):
-                self.tiles[x * MAP_HEIGHT + y] = Tile(TileType.WATER)
+        WATER_POOL_START = (width // 4 - 2, height // 2 - 2)
+        WATER_POOL_END = (width // 4 + 2, height // 2 + 2)
+        water_pool = self.grid.region(WATER_POOL_START[0], WATER_POOL_START[1], WATER_POOL_END[0], WATER_POOL_END[1])
+        water_pool.tile_types[:] = TileType.WATER.value
+        water_pool.collidable[:] = TileType.WATER.collidable
+        
+        self.dual_grid = compute_dual_grid(self.get_tile_type_region(-1, -1, width + 1, height + 1))
+        self.terrain_chunks = OrderedDict()
+        self.grid.on_tile_type_changed = self.update_dual_grid
         
         self.entities = []
+        self.entity_hash = SpatialHash(ENTITY_HASH_CELL_SIZE)
+        self.shadows = ShadowSwarm()
+        self.flow_field = FlowField(self.grid)
+        self.grid.on_structure_changed = self.flow_field.on_structure_changed
+        self.lod = SimulationLOD(width, height)
+        self.owed_map_updates = np.zeros(self.lod.levels.shape, dtype=np.int64)
+    
+    def get_tile(self, tile_x: int, tile_y: int) -> Optional[Tile]:
+        if not self.grid.in_bounds(tile_x, tile_y):
+            return None
+        return Tile(self.grid, tile_x, tile_y)
+    
+    def get_tile_type_region(self, x_start: int, y_start: int, x_end: int, y_end: int) -> np.ndarray:
+        """Returns the tile types in the given rectangle, treating everything outside the map as soil."""
+        tile_types = np.full((x_end - x_start, y_end - y_start), TileType.SOIL.value, dtype=np.uint8)
+        region = self.grid.region(x_start, y_start, x_end, y_end)
+        x, y = region.x_offset - x_start, region.y_offset - y_start
+        tile_types[x:x + region.width, y:y + region.height] = region.tile_types
+        return tile_types
+    
+    def update_dual_grid(self, tile_x: int, tile_y: int):
+        """Patches the cached dual-grid cells that have the given tile as one of their corners."""
+        self.dual_grid[:, tile_x:tile_x + 2, tile_y:tile_y + 2] = compute_dual_grid(self.get_tile_type_region(tile_x - 1, tile_y - 1, tile_x + 2, tile_y + 2))
+        for cell_x in range(tile_x - 1, tile_x + 1):
+            for cell_y in range(tile_y - 1, tile_y + 1):
+                self.terrain_chunks.pop((cell_x // TERRAIN_CHUNK_SIZE, cell_y // TERRAIN_CHUNK_SIZE), None)
+    
+    def get_dual_grid_region(self, x_start: int, y_start: int, x_end: int, y_end: int) -> np.ndarray:
+        """Slices the cached dual-grid table for the given cells. Cells entirely outside the map are drawn as plain soil."""
+        bitmasks = np.zeros((len(TileType), x_end - x_start, y_end - y_start), dtype=np.uint8)
+        bitmasks[TileType.SOIL.layer] = 0b1111
+        
+        table_x_start, table_x_end = max(x_start, -1), min(x_end, self.width)
+        table_y_start, table_y_end = max(y_start, -1), min(y_end, self.height)
+        if table_x_start < table_x_end and table_y_start < table_y_end:
+            bitmasks[:, table_x_start - x_start:table_x_end - x_start, table_y_start - y_start:table_y_end - y_start] = \
+                self.dual_grid[:, table_x_start + 1:table_x_end + 1, table_y_start + 1:table_y_end + 1]
+        return bitmasks
+    
+    def render_terrain_chunk(self, chunk_x: int, chunk_y: int) -> pygame.Surface:
+        """Composites the dual-grid layers of every cell in a chunk into a single surface."""
+        chunk_pixels = TERRAIN_CHUNK_SIZE * TILE_SIZE
+        surface = pygame.Surface((chunk_pixels, chunk_pixels)).convert()
+        surface.fill((0, 0, 0))
+        
+        cell_x, cell_y = chunk_x * TERRAIN_CHUNK_SIZE, chunk_y * TERRAIN_CHUNK_SIZE
+        bitmasks = self.get_dual_grid_region(cell_x, cell_y, cell_x + TERRAIN_CHUNK_SIZE, cell_y + TERRAIN_CHUNK_SIZE)
+        
+        # Layers are still blitted in order across the whole chunk, just like drawing straight to the window
+        for layer, tile_type in enumerate(TILE_TYPE_BY_LAYER):
+            xs, ys = np.nonzero(bitmasks[layer])
+            if len(xs) == 0:
+                continue
+            sprites = sprite_atlas.get_frames(tile_type.atlas_asset)
+            surface.blits([
+                (sprites[bitmask].page, (x * TILE_SIZE, y * TILE_SIZE), sprites[bitmask].rect)
+                for x, y, bitmask in zip(xs.tolist(), ys.tolist(), bitmasks[layer, xs, ys].tolist())
+            ], False)
+        return surface
+    
+    def get_terrain_chunk(self, chunk_x: int, chunk_y: int) -> pygame.Surface:
+        chunk = self.terrain_chunks.get((chunk_x, chunk_y))
+        if chunk is None:
+            chunk = self.render_terrain_chunk(chunk_x, chunk_y)
+            self.terrain_chunks[(chunk_x, chunk_y)] = chunk
+        else:
+            self.terrain_chunks.move_to_end((chunk_x, chunk_y))
+        return chunk
+    
+    def draw_terrain(self, win: pygame.Surface, camera_position: pygame.Vector2, x_start: int, x_end: int, y_start: int, y_end: int):
+        """Draws the dual-grid cells from (x_start, y_start) up to (x_end, y_end) using the pre-rendered chunks."""
+        chunk_x_start = x_start // TERRAIN_CHUNK_SIZE
+        chunk_x_end = (x_end - 1) // TERRAIN_CHUNK_SIZE + 1
+        chunk_y_start = y_start // TERRAIN_CHUNK_SIZE
+        chunk_y_end = (y_end - 1) // TERRAIN_CHUNK_SIZE + 1
+        
+        chunk_pixels = TERRAIN_CHUNK_SIZE * TILE_SIZE
+        blits = []
+        for chunk_x in range(chunk_x_start, chunk_x_end):
+            for chunk_y in range(chunk_y_start, chunk_y_end):
+                # The dual grid is offset by half a tile from the tile grid
+                x = chunk_x * chunk_pixels - camera_position.x + get_width() // 2 + TILE_SIZE // 2
+                y = chunk_y * chunk_pixels - camera_position.y + get_height() // 2 + TILE_SIZE // 2
+                blits.append((self.get_terrain_chunk(chunk_x, chunk_y), (x, y)))
+        win.blits(blits, False)
+        
+        visible_chunks = (chunk_x_end - chunk_x_start) * (chunk_y_end - chunk_y_start)
+        while len(self.terrain_chunks) > max(TERRAIN_CHUNK_CACHE_SIZE, visible_chunks):
+            self.terrain_chunks.popitem(last=False)
     
     def add_entity(self, entity: Entity):
         self.entities.append(entity)
+        self.entity_hash.add(entity)
+    
+    def remove_entities(self, predicate: Callable[[Entity], bool]):
+        """Removes every entity the predicate returns true for."""
+        kept = []
+        for entity in self.entities:
+            if predicate(entity):
+                self.entity_hash.remove(entity)
+            else:
+                kept.append(entity)
+        self.entities = kept
+    
+    def update_entities(self, delta: float):
+        """Updates the entities and shadows, less often in regions far from the screen."""
+        for entity in self.entities:
+            entity.owed_time += delta
+            if self.lod.is_due(self.lod.get_level(entity.x, entity.y), entity.owed_time, SIM_REDUCED_STEP):
+                entity.update(entity.owed_time, self)
+                entity.owed_time = 0
+                # Entities may move while updating
+                self.move_entity(entity)
+        self.shadows.update(delta, self)
     
-    def update(self, audio_manager: AudioManager, dialogue_manager: DialogueManager):
-        current_time = pygame.time.get_ticks()
-        if current_time - self.last_map_update < MAP_UPDATE_RATE:
+    def move_entity(self, entity: Entity):
+        """Must be called after an entity moves or changes size outside of its update, which is handled by update_entities."""
+        self.entity_hash.move(entity)
+    
+    def get_entities_in_rect(self, min_x: float, min_y: float, max_x: float, max_y: float) -> list[Entity]:
+        """Returns the entities whose bounds might overlap the rectangle, in the order they were added."""
+        return self.entity_hash.query_rect(min_x, min_y, max_x, max_y)
+    
+    def update(self, delta: float, audio_manager: AudioManager, dialogue_manager: DialogueManager):
+        # A long step (e.g. headless with a big --step) is owed every map update it covers, and the rest
+        # of its time carries over to the next one
+        self.map_update_time += delta * 1000
+        map_updates = int(self.map_update_time // MAP_UPDATE_RATE)
+        if map_updates == 0:
             return
-        self.last_map_update = current_time
+        self.map_update_time -= map_updates * MAP_UPDATE_RATE
 
-        random_ticks = math.ceil(MAP_WIDTH * MAP_HEIGHT * RANDOM_TICK_PER_UPDATE_RATIO)
-        for i in range(random_ticks):
-            tile = random.randint(0, len(self.tiles) - 1)
-            self.tiles[tile].random_tick(audio_manager, dialogue_manager)
+        self.owed_map_updates += map_updates
+        self.random_tick(dialogue_manager, self.lod.is_due(self.lod.levels, self.owed_map_updates, SIM_REDUCED_MAP_UPDATES))
+    
+    def catch_up(self, dialogue_manager: DialogueManager):
+        """Gives every region the random ticks and every shadow the time it's owed, e.g. before looking at the crops of the whole map."""
+        self.random_tick(dialogue_manager, np.ones(self.owed_map_updates.shape, dtype=bool))
+        self.shadows.catch_up(self)
+    
+    def random_tick(self, dialogue_manager: DialogueManager, due_regions: np.ndarray):
+        """
+        Gives random ticks to the tiles whose structures do something when ticked, for every map update their
+        region is owed, in the regions that are due. Only those tiles are sampled, so this scales with the number
+        of growing crops rather than the size of the map. Other regions keep what they're owed; see SimulationLOD.
+        """
+        ticking = self.grid.ticking.get_members()
+        region_x, region_y = np.divmod(ticking, self.height)
+        region_x //= SIM_REGION_SIZE
+        region_y //= SIM_REGION_SIZE
+        
+        # Regions with nothing growing aren't owed anything
+        growing_regions = np.zeros(self.owed_map_updates.shape, dtype=bool)
+        growing_regions[region_x, region_y] = True
+        self.owed_map_updates[~growing_regions] = 0
+        updates = np.where(due_regions[region_x, region_y], self.owed_map_updates[region_x, region_y], 0)
+        self.owed_map_updates[due_regions] = 0
+        if not updates.any():
+            return
+        
+        # Several updates' worth of ticks are drawn at once, which has the same distribution as ticking every update
+        if self.exact_random_ticks:
+            # Equivalent to picking this many tiles uniformly across the whole map (with replacement) every
+            # update and ticking the ones that happen to be growing
+            random_ticks = math.ceil(self.width * self.height * RANDOM_TICK_PER_UPDATE_RATIO)
+            tick_counts = self.rng.binomial(updates * random_ticks, 1 / (self.width * self.height))
+        else:
+            tick_counts = self.rng.binomial(updates, RANDOM_TICK_PER_UPDATE_RATIO)
+        
+        SoilStructure.random_tick_batch(self.grid, ticking.copy(), tick_counts, self.rng, dialogue_manager)
     
     def is_collision(self, tile_x, tile_y):
-        tile_index = int(tile_x * MAP_HEIGHT + tile_y)
-        if tile_index < 0 or tile_index >= len(self.tiles):
+        tile_x, tile_y = int(tile_x), int(tile_y)
+        if not self.grid.in_bounds(tile_x, tile_y):
             return False
-        return self.tiles[tile_index].is_collidable()
+        return bool(self.grid.collidable[tile_x, tile_y])
     
     def get_interaction(self, tile_x: int, tile_y: int, item: Item, player: "Player", audio_manager: AudioManager, dialogue_manager: DialogueManager, rising_edge: bool) -> Callable[[], None]:
         """
         Returns a lambda that will execute the proper interaction based on the selected tile and item,
         or None if no interaction should occur.
         """
-        tile_index = tile_x * MAP_HEIGHT + tile_y
-        if tile_index < 0 or tile_index >= len(self.tiles):
+        tile = self.get_tile(tile_x, tile_y)
+        if tile is None:
             return
         
         if rising_edge:
-            for entity in self.entities:
+            for entity in self.entity_hash.query_point(tile_x * TILE_SIZE + TILE_SIZE // 2, tile_y * TILE_SIZE + TILE_SIZE // 2):
                 interaction = entity.get_interaction(tile_x, tile_y)
                 if interaction:
                     return interaction
 
         tile_center_pos = (tile_x * TILE_SIZE + TILE_SIZE // 2, tile_y * TILE_SIZE + TILE_SIZE // 2)
-        return self.tiles[tile_index].get_interaction(item, player, audio_manager, dialogue_manager, tile_center_pos, rising_edge)
+        return tile.get_interaction(item, player, audio_manager, dialogue_manager, tile_center_pos, rising_edge)
 
     def check_proximity_interaction(self, player: "Player") -> Callable[[], None]:
-        for entity in self.entities:
+        for entity in self.get_entities_in_rect(*player.get_collision_rect()):
             interaction = entity.check_proximity_interaction(player)
             if interaction:
                 return interaction
         return None
 
     last_draw_time = 0
-    def draw(self, win: pygame.Surface, camera_position: pygame.Vector2, player: "Player", selected_cell_x: int, selected_cell_y: int, selection_color: str, clicking: bool, interacting: bool):
-        current_time = pygame.time.get_ticks()
+    def draw(self, win: pygame.Surface, camera_position: pygame.Vector2, player: "Player", selected_cell_x: int, selected_cell_y: int, selection_color: str, clicking: bool, interacting: bool, interpolation: float = 1):
+        current_time = sim_clock.get_ticks()
         delta = (current_time - self.last_draw_time) / 1000
         self.last_draw_time = current_time
         
@@ -106,76 +330,44 @@ class Map:
         y_start = math.floor((camera_position.y - get_height() / 2) / TILE_SIZE) - 1
         y_end = math.ceil((camera_position.y + get_height() / 2) / TILE_SIZE)
         
-        tile_positions = [(
-            x * TILE_SIZE - camera_position.x + get_width() // 2,
-            y * TILE_SIZE - camera_position.y + get_height() // 2,
-            x, y
-        ) for x in range(x_start, x_end) for y in range(y_start, y_end)]
-        
         # Draw the main tile grid
-        blit_layers: list[list[tuple[pygame.Surface, tuple[int, int]]]] = [[] for _ in range(len(TileType))]
-        blank_tile = Tile(TileType.SOIL)
-        for (x, y, tile_x, tile_y) in tile_positions:
-            # Since this is a dual-grid system, we perform the following steps:
-            # - Get the tile at each corner of the drawn tile position
-            # - Separate the tiles into 1-4 bitmasks--one per type of tile
-            # - Look up the bitmask with its tile type in tilemap_atlases, BUT draw the lowest layer as a full tile
-            # - Add the resulting image to the blit_layers list based on the layer of the tile type
-            
-            # Get the tile at each corner of the drawn tile position
-            corner_tiles = [
-                (tile_x, tile_y),
-                (tile_x + 1, tile_y),
-                (tile_x, tile_y + 1),
-                (tile_x + 1, tile_y + 1)
-            ]
-            corner_tiles = list(map(
-                lambda pos: self.tiles[pos[0] * MAP_HEIGHT + pos[1]] if pos[0] >= 0 and pos[0] < MAP_WIDTH and pos[1] >= 0 and pos[1] < MAP_HEIGHT else blank_tile,
-                corner_tiles
-            ))
-            
-            # Separate the tiles into a bitmask per tile type
-            bitmasks: dict[TileType, int] = {}
-            for (tile, i) in zip(corner_tiles, range(4)):
-                if tile.tile_type not in bitmasks:
-                    bitmasks[tile.tile_type] = 0
-                bitmasks[tile.tile_type] |= 1 << i
-            
-            lowest_layer = min(map(lambda tile: tile.layer, bitmasks))
-
-            # Draw the tile based on the bitmask
-            dual_grid_pos = (x + TILE_SIZE // 2, y + TILE_SIZE // 2)
-            for tile_type, bitmask in bitmasks.items():
-                if tile_type.layer == lowest_layer:
-                    bitmask = 0b1111
-                
-                atlas: pygame.Surface = tile_type.atlas[bitmask]
-                blit_layers[tile_type.layer].append((atlas, dual_grid_pos))
-        
-        for blits in blit_layers:
-            if len(blits) == 0:
-                continue
-            win.blits(blits, False)
+        self.draw_terrain(win, camera_position, x_start, x_end, y_start, y_end)
         
         # Draw everything on tiles
-        for (x, y, tile_x, tile_y) in filter(lambda pos: pos != None, tile_positions):
-            idx = tile_x * MAP_HEIGHT + tile_y
-            if idx >= 0 and idx < len(self.tiles):
-                tile_center_pos = (tile_x * TILE_SIZE + TILE_SIZE // 2, tile_y * TILE_SIZE + TILE_SIZE // 2)
-                self.tiles[idx].draw(win, x, y, tile_center_pos, delta)
+        visible = self.grid.region(x_start, y_start, x_end, y_end)
+        blits = []
+        for tile_x, tile_y in zip(*np.nonzero(visible.structures)):
+            tile_x, tile_y = int(tile_x) + visible.x_offset, int(tile_y) + visible.y_offset
+            x = tile_x * TILE_SIZE - camera_position.x + get_width() // 2
+            y = tile_y * TILE_SIZE - camera_position.y + get_height() // 2
+            tile_center_pos = (tile_x * TILE_SIZE + TILE_SIZE // 2, tile_y * TILE_SIZE + TILE_SIZE // 2)
+            Tile(self.grid, tile_x, tile_y).draw(blits, x, y, tile_center_pos, delta)
+        win.blits(blits, False)
         
         # Draw entities
-        for entity in self.entities:
+        for entity in self.get_visible_entities(camera_position):
             if entity.y + entity.height < player.pos.y + player.radius:
-                entity.draw(win, camera_position, player, self.selection_images["green_1"] if interacting else self.selection_images["green_0"])
+                entity.draw(win, camera_position, player, self.get_selection_sprite("green", interacting))
+        self.shadows.draw(win, camera_position, self.shadows.positions[:, 1] + TILE_SIZE < player.pos.y + player.radius, interpolation)
         
         # Draw selection
         x = selected_cell_x * TILE_SIZE - camera_position.x + get_width() // 2
         y = selected_cell_y * TILE_SIZE - camera_position.y + get_height() // 2
-        win.blit(self.selection_images[selection_color + "_" + ("1" if clicking else "0")], (x, y))
+        self.get_selection_sprite(selection_color, clicking).draw(win, (x, y))
+    
+    def get_selection_sprite(self, color: str, pressed: bool) -> AtlasSprite:
+        return sprite_atlas.get_image(self.selection_images[color + "_" + ("1" if pressed else "0")])
     
-    def draw_front_of_player(self, win: pygame.Surface, camera_position: pygame.Vector2, player: "Player", interacting: bool):
+    def get_visible_entities(self, camera_position: pygame.Vector2) -> list[Entity]:
+        # With a tile of margin for shaking and the interaction selector
+        return self.get_entities_in_rect(
+            camera_position.x - get_width() / 2 - TILE_SIZE, camera_position.y - get_height() / 2 - TILE_SIZE,
+            camera_position.x + get_width() / 2 + TILE_SIZE, camera_position.y + get_height() / 2 + TILE_SIZE
+        )
+    
+    def draw_front_of_player(self, win: pygame.Surface, camera_position: pygame.Vector2, player: "Player", interacting: bool, interpolation: float = 1):
         # Draw entities
-        for entity in self.entities:
+        for entity in self.get_visible_entities(camera_position):
             if entity.y + entity.height >= player.pos.y + player.radius:
-                entity.draw(win, camera_position, player, self.selection_images["green_1"] if interacting else self.selection_images["green_0"])
\ No newline at end of file
+                entity.draw(win, camera_position, player, self.get_selection_sprite("green", interacting))
+        self.shadows.draw(win, camera_position, self.shadows.positions[:, 1] + TILE_SIZE >= player.pos.y + player.radius, interpolation)
\ No newline at end of file
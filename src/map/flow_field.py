@@ -0,0 +1,169 @@
+import math
+from typing import Iterator
+
+import numpy as np
+
+from constants import FLOW_FIELD_WALL_COST
+from map.grid import StructureKind, TileGrid
+
+# Offsets to the 8 neighbours of a tile, and how far away each one is
+NEIGHBOR_OFFSETS = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+NEIGHBOR_STEPS = [math.hypot(dx, dy) for dx, dy in NEIGHBOR_OFFSETS]
+
+class FlowField:
+    """
+    For every tile, the cheapest way to the nearest planted crop, shared by every shadow: a shadow only has
+    to look up the next tile for the one it's on. Entering a tile costs the distance to it times the tile's
+    cost, which is FLOW_FIELD_WALL_COST for walls and 1 otherwise, so shadows go around walls unless that's
+    a long way.
+
+    It's built with a multi-source Dijkstra from every crop. When walls or crops change afterwards, only the
+    tiles whose route went through a changed tile are recomputed, the next time the field is used.
+    Tiles are flat indices (x * height + y) like in TileGrid.
+    """
+    grid: TileGrid
+    costs: np.ndarray # float, the cost of entering each tile
+    sources: np.ndarray # bool, tiles with a crop
+    distances: np.ndarray # float, the cost of the route from each tile; inf if there's no crop to go to
+    # The tile after this one on its route, or -1 for crops and tiles without a route
+    next_tiles: np.ndarray
+    # Tiles whose cost or source state changed since the field was last repaired
+    changed: set[int]
+    # The field is only kept up to date once it has been built
+    built: bool = False
+    # For each direction in NEIGHBOR_OFFSETS, which tiles have a neighbour on the map that way
+    has_neighbor: np.ndarray
+
+    def __init__(self, grid: TileGrid):
+        self.grid = grid
+        tile_count = grid.width * grid.height
+        self.costs = np.ones(tile_count)
+        self.sources = np.zeros(tile_count, dtype=bool)
+        self.distances = np.full(tile_count, np.inf)
+        self.next_tiles = np.full(tile_count, -1, dtype=np.int64)
+        self.changed = set()
+
+        x, y = np.divmod(np.arange(tile_count), grid.height)
+        self.has_neighbor = np.array([
+            (x + dx >= 0) & (x + dx < grid.width) & (y + dy >= 0) & (y + dy < grid.height)
+            for dx, dy in NEIGHBOR_OFFSETS
+        ])
+
+    def get_cost(self, x: int, y: int) -> float:
+        return FLOW_FIELD_WALL_COST if self.grid.structures[x, y] == StructureKind.WALL else 1
+
+    def is_source(self, x: int, y: int) -> bool:
+        return self.grid.structures[x, y] == StructureKind.SOIL and self.grid.crops[x, y] != 0
+
+    def build(self):
+        """Computes the whole field from the grid's current walls and crops."""
+        grid = self.grid
+        self.costs = np.where(grid.structures == StructureKind.WALL, FLOW_FIELD_WALL_COST, 1.0).ravel()
+        self.sources = ((grid.structures == StructureKind.SOIL) & (grid.crops != 0)).ravel()
+        self.distances.fill(np.inf)
+        self.next_tiles.fill(-1)
+        self.changed.clear()
+        self.built = True
+
+        sources = np.flatnonzero(self.sources)
+        self.distances[sources] = 0
+        self.propagate(sources)
+
+    def on_structure_changed(self, x: int, y: int):
+        if not self.built:
+            return
+        tile = x * self.grid.height + y
+        cost, is_source = self.get_cost(x, y), self.is_source(x, y)
+        if cost != self.costs[tile] or is_source != self.sources[tile]:
+            self.costs[tile] = cost
+            self.sources[tile] = is_source
+            self.changed.add(tile)
+
+    def get_neighbors(self, tiles: np.ndarray) -> Iterator[tuple[np.ndarray, np.ndarray, float]]:
+        """
+        For each direction, yields the given tiles that have a neighbour on the map that way, those neighbours
+        and how far away they are. Each tile has at most one neighbour per direction, so the neighbours are unique.
+        """
+        height = self.grid.height
+        for direction, ((dx, dy), step) in enumerate(zip(NEIGHBOR_OFFSETS, NEIGHBOR_STEPS)):
+            next_to = tiles[self.has_neighbor[direction, tiles]]
+            yield next_to, next_to + (dx * height + dy), step
+
+    def propagate(self, tiles: np.ndarray):
+        """
+        Dijkstra from the given tiles, whose distances and next tiles must already be set. Entering a tile
+        always costs at least 1, so no unfinished tile within 1 of the closest one can be made any cheaper:
+        they're all finished together, in a few NumPy operations per direction instead of a heap operation each.
+        """
+        distances, costs, next_tiles = self.distances, self.costs, self.next_tiles
+        is_open = np.zeros(len(distances), dtype=bool)
+        open_tiles = np.unique(tiles)
+        is_open[open_tiles] = True
+        while len(open_tiles) > 0:
+            open_distances = distances[open_tiles]
+            finishing = open_distances < open_distances.min() + 1
+            tiles, open_tiles = open_tiles[finishing], open_tiles[~finishing]
+            is_open[tiles] = False
+
+            # Neighbours get here by entering these tiles. The directions go one after the other, so a
+            # neighbour of several of them ends up with the cheapest.
+            opened = [open_tiles]
+            for via, neighbors, step in self.get_neighbors(tiles):
+                neighbor_distances = distances[via] + step * costs[via]
+                closer = neighbor_distances < distances[neighbors]
+                neighbors = neighbors[closer]
+                distances[neighbors] = neighbor_distances[closer]
+                next_tiles[neighbors] = via[closer]
+                neighbors = neighbors[~is_open[neighbors]]
+                is_open[neighbors] = True
+                opened.append(neighbors)
+            open_tiles = np.concatenate(opened)
+
+    def repair(self):
+        """Recomputes the routes that went through a tile that changed since the last repair."""
+        if not self.changed:
+            return
+        # The changed tiles and every tile whose route leads through one of them. Routes only go to
+        # neighbouring tiles, so those are found by walking back from the changed tiles one neighbour at a time.
+        invalid = np.zeros(len(self.distances), dtype=bool)
+        found = np.fromiter(self.changed, dtype=np.int64, count=len(self.changed))
+        self.changed.clear()
+        invalid[found] = True
+        invalid_tiles = [found]
+        while len(found) > 0:
+            # A tile only has one next tile, so nothing is found twice
+            found = np.concatenate([
+                neighbors[(self.next_tiles[neighbors] == next_to) & ~invalid[neighbors]]
+                for next_to, neighbors, _ in self.get_neighbors(found)
+            ])
+            invalid[found] = True
+            invalid_tiles.append(found)
+        invalid_tiles = np.concatenate(invalid_tiles)
+
+        self.distances[invalid_tiles] = np.inf
+        self.next_tiles[invalid_tiles] = -1
+
+        # Start the invalidated tiles from their best remaining neighbour (or at 0 for crops) and let Dijkstra
+        # fix the rest, which also lowers the routes of other tiles where something got cheaper
+        sources = invalid_tiles[self.sources[invalid_tiles]]
+        self.distances[sources] = 0
+        others = invalid_tiles[~self.sources[invalid_tiles]]
+        for tiles, neighbors, step in self.get_neighbors(others):
+            valid = ~invalid[neighbors]
+            tiles, neighbors = tiles[valid], neighbors[valid]
+            distances = self.distances[neighbors] + step * self.costs[neighbors]
+            closer = distances < self.distances[tiles]
+            self.distances[tiles[closer]] = distances[closer]
+            self.next_tiles[tiles[closer]] = neighbors[closer]
+        self.propagate(np.concatenate([sources, others[self.distances[others] < np.inf]]))
+
+    def get_next_tiles(self, tile_x: np.ndarray, tile_y: np.ndarray) -> np.ndarray:
+        """
+        Returns the next tile toward a crop for each of the given tiles, or -1 where there's no route,
+        the tile is a crop or it's off the map.
+        """
+        self.repair()
+        in_bounds = (tile_x >= 0) & (tile_x < self.grid.width) & (tile_y >= 0) & (tile_y < self.grid.height)
+        next_tiles = np.full(len(tile_x), -1, dtype=np.int64)
+        next_tiles[in_bounds] = self.next_tiles[tile_x[in_bounds] * self.grid.height + tile_y[in_bounds]]
+        return next_tiles
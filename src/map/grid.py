@@ -0,0 +1,149 @@
+from enum import IntEnum
+from typing import Callable, Optional, Self
+
+import numpy as np
+
+from constants import MAX_PLANT_GROWTH_STAGE
+
+class StructureKind(IntEnum):
+    """The kind of structure stored in a grid cell. Structure state lives in the TileGrid arrays."""
+    NONE = 0
+    SOIL = 1
+    WALL = 2
+
+class SparseTileSet:
+    """
+    A set of flat tile indices (x * height + y) with O(1) insertion, removal and membership tests.
+    The members are kept packed at the start of an array, so they can be sampled and processed in batches.
+    """
+    members: np.ndarray
+    count: int = 0
+    # For every tile, its position in members, or -1 if it isn't in the set
+    positions: np.ndarray
+
+    def __init__(self, tile_count: int):
+        self.members = np.zeros(16, dtype=np.int64)
+        self.positions = np.full(tile_count, -1, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, index: int) -> bool:
+        return self.positions[index] >= 0
+
+    def get_members(self) -> np.ndarray:
+        """Returns a view of the members, in no particular order. Only valid until the set is next modified."""
+        return self.members[:self.count]
+
+    def add(self, index: int):
+        if self.positions[index] >= 0:
+            return
+        if self.count == len(self.members):
+            self.members = np.resize(self.members, len(self.members) * 2)
+        self.members[self.count] = index
+        self.positions[index] = self.count
+        self.count += 1
+
+    def remove(self, index: int):
+        position = self.positions[index]
+        if position < 0:
+            return
+        # Swap the last member into the removed member's place
+        last = self.members[self.count - 1]
+        self.members[position] = last
+        self.positions[last] = position
+        self.positions[index] = -1
+        self.count -= 1
+
+class TileGrid:
+    """
+    Struct-of-arrays storage for every tile on the map. All arrays are indexed [x, y].
+    Tile, SoilStructure and WallStructure are thin views over a cell of this grid, so the
+    interaction code can keep working with objects while whole-grid passes can be vectorized.
+    """
+    width: int
+    height: int
+    # Position of this grid's [0, 0] in map coordinates; only non-zero for regions
+    x_offset: int = 0
+    y_offset: int = 0
+
+    tile_types: np.ndarray # uint8 TileType values
+    collidable: np.ndarray # bool
+    structures: np.ndarray # uint8 StructureKind values
+    crops: np.ndarray # uint8; 0 for no crop, otherwise the Item value of the planted seeds
+    growth_stages: np.ndarray # uint8
+    wet: np.ndarray # bool
+    wall_damage: np.ndarray # uint8
+
+    # Tiles whose structure currently does something on random ticks, i.e. soil with a growing crop.
+    # Kept up to date by update_ticking, which the structure views call whenever they change.
+    ticking: SparseTileSet
+
+    # Called with the tile position whenever a tile type changes
+    on_tile_type_changed: Optional[Callable[[int, int], None]] = None
+    # Called with the tile position whenever a structure or its state changes, from update_ticking
+    on_structure_changed: Optional[Callable[[int, int], None]] = None
+
+    def __init__(self, width: int, height: int, tile_type: int):
+        self.width = width
+        self.height = height
+
+        self.tile_types = np.full((width, height), tile_type, dtype=np.uint8)
+        self.collidable = np.zeros((width, height), dtype=np.bool_)
+        self.structures = np.zeros((width, height), dtype=np.uint8)
+        self.crops = np.zeros((width, height), dtype=np.uint8)
+        self.growth_stages = np.zeros((width, height), dtype=np.uint8)
+        self.wet = np.zeros((width, height), dtype=np.bool_)
+        self.wall_damage = np.zeros((width, height), dtype=np.uint8)
+
+        self.ticking = SparseTileSet(width * height)
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return x >= 0 and x < self.width and y >= 0 and y < self.height
+
+    def region(self: Self, x_start: int, y_start: int, x_end: int, y_end: int) -> Self:
+        """
+        Returns a grid over the given rectangle, clamped to this grid, whose arrays are views into this one.
+        Writing to the region's arrays writes to this grid, but doesn't trigger on_tile_type_changed or
+        update the ticking set, so regions should only be used for reading and bulk array writes.
+        """
+        x_start, x_end = max(0, x_start), min(self.width, max(0, x_end))
+        y_start, y_end = max(0, y_start), min(self.height, max(0, y_end))
+        x_end, y_end = max(x_start, x_end), max(y_start, y_end)
+
+        region = object.__new__(TileGrid)
+        region.width = x_end - x_start
+        region.height = y_end - y_start
+        region.x_offset = self.x_offset + x_start
+        region.y_offset = self.y_offset + y_start
+        for name in ["tile_types", "collidable", "structures", "crops", "growth_stages", "wet", "wall_damage"]:
+            setattr(region, name, getattr(self, name)[x_start:x_end, y_start:y_end])
+        return region
+
+    def set_tile_type(self, x: int, y: int, tile_type: int, collidable: bool):
+        self.tile_types[x, y] = tile_type
+        self.collidable[x, y] = collidable
+        if self.on_tile_type_changed:
+            self.on_tile_type_changed(x, y)
+
+    def set_structure(self, x: int, y: int, kind: StructureKind):
+        """Replaces the structure in a cell, resetting all of its state."""
+        self.structures[x, y] = kind
+        self.crops[x, y] = 0
+        self.growth_stages[x, y] = 0
+        self.wet[x, y] = False
+        self.wall_damage[x, y] = 0
+        self.update_ticking(x, y)
+
+    def clear_structure(self, x: int, y: int):
+        self.set_structure(x, y, StructureKind.NONE)
+
+    def update_ticking(self, x: int, y: int):
+        """Adds or removes a tile from the ticking set based on its current state."""
+        index = x * self.height + y
+        if self.structures[x, y] == StructureKind.SOIL and self.crops[x, y] != 0 and self.growth_stages[x, y] < MAX_PLANT_GROWTH_STAGE:
+            self.ticking.add(index)
+        else:
+            self.ticking.remove(index)
+        if self.on_structure_changed:
+            self.on_structure_changed(x, y)
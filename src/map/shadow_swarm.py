@@ -0,0 +1,212 @@
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pygame
+
+from assets import asset_manager, image_baker
+from bundles import open_asset
+from constants import FARMABLE_MAP_END, FARMABLE_MAP_START, SIM_REDUCED_STEP, TILE_SIZE
+from graphics import get_height, get_width
+from map.grid import StructureKind, TileGrid
+from map.sim_lod import SimulationLevel
+import sim_clock
+from utils import get_asset
+
+if TYPE_CHECKING:
+    from map import Map
+
+SHADOW_FRAME_COUNT = 5
+SHADOW_ANIMATION_FPS = 60
+MOVE_CHANCE_PER_SECOND = 0.7
+MOVE_AMOUNT = 4
+SHADOW_SPEED = 150 # Pixels per second, scaled by distance until getting close
+SHADOW_SHAKE = 2
+# Shadows flicker between these alphas
+SHADOW_ALPHAS = [130, 135, 140, 145, 150, 155, 160, 165, 170]
+
+# Shaking and flickering are purely visual, so they have their own generator; see effects_random
+rng = np.random.default_rng()
+
+def split_shadow_frames(sprite_sheet: pygame.Surface) -> list[pygame.Surface]:
+    sprite_sheet = sprite_sheet.convert_alpha()
+    frames = []
+    for i in range(SHADOW_FRAME_COUNT):
+        subsurface = sprite_sheet.subsurface(pygame.Rect(i * 16, 0, 16, 16))
+        frames.append(pygame.transform.scale(subsurface, (TILE_SIZE, TILE_SIZE)))
+    return frames
+
+shadow_sheet_path = get_asset("entities", "sillyguy.png")
+shadow_frames = asset_manager.load(f"frames:{shadow_sheet_path}", lambda: pygame.image.load(open_asset(shadow_sheet_path), shadow_sheet_path), split_shadow_frames, shadow_sheet_path, image_baker)
+
+class ShadowSwarm:
+    """
+    Every shadow on the map, stored as arrays so they're all moved, retargeted and checked against the
+    structure grid in a few NumPy passes instead of one Python object each. Index i of every array is shadow i.
+    Shadows follow the map's flow field toward the crops, and wander when there are none to reach.
+    """
+    positions: np.ndarray # (n, 2) float, in pixels
+    # Positions before the last update, for drawing between simulation steps
+    previous_positions: np.ndarray
+    targets: np.ndarray # (n, 2) float, in pixels; only meaningful where has_target is set
+    has_target: np.ndarray # bool
+    # Each shadow's animation is this many frames ahead of the others
+    frame_offsets: np.ndarray # int
+    # Seconds each shadow is owed since it was last updated
+    owed_time: np.ndarray
+
+    # One copy of each frame per alpha in SHADOW_ALPHAS, so shadows with different alphas can be drawn in one blits call
+    alpha_frames: dict[tuple[int, int], pygame.Surface]
+
+    def __init__(self):
+        self.clear()
+        self.alpha_frames = {}
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def spawn(self, count: int, sim_rng: np.random.Generator):
+        """Adds shadows at random tiles of the farm."""
+        tiles = np.stack([
+            sim_rng.integers(FARMABLE_MAP_START[0], FARMABLE_MAP_END[0], size=count, endpoint=True),
+            sim_rng.integers(FARMABLE_MAP_START[1], FARMABLE_MAP_END[1], size=count, endpoint=True)
+        ], axis=1)
+        self.positions = np.concatenate([self.positions, tiles * TILE_SIZE])
+        self.previous_positions = np.concatenate([self.previous_positions, tiles * TILE_SIZE])
+        self.targets = np.concatenate([self.targets, np.zeros((count, 2))])
+        self.has_target = np.concatenate([self.has_target, np.zeros(count, dtype=bool)])
+        self.frame_offsets = np.concatenate([self.frame_offsets, sim_rng.integers(0, SHADOW_FRAME_COUNT, size=count)])
+        self.owed_time = np.concatenate([self.owed_time, np.zeros(count)])
+
+    def clear(self):
+        self.positions = np.zeros((0, 2))
+        self.previous_positions = np.zeros((0, 2))
+        self.targets = np.zeros((0, 2))
+        self.has_target = np.zeros(0, dtype=bool)
+        self.frame_offsets = np.zeros(0, dtype=np.int64)
+        self.owed_time = np.zeros(0)
+
+    def update(self, delta: float, map: "Map"):
+        if len(self) == 0:
+            return
+        self.previous_positions = self.positions.copy()
+        # Shadows in reduced regions are updated less often, with all the time they're owed; see SimulationLOD.
+        # They're cleared at dawn, so ones in dormant regions are still updated like that, or they'd miss the night.
+        self.owed_time += delta
+        levels = np.minimum(map.lod.get_levels(self.positions[:, 0], self.positions[:, 1]), SimulationLevel.REDUCED)
+        self.step_due(map.lod.is_due(levels, self.owed_time, SIM_REDUCED_STEP), map)
+
+    def catch_up(self, map: "Map"):
+        """Gives every shadow the time it's owed, e.g. before they're cleared."""
+        if len(self) > 0:
+            self.step_due(self.owed_time > 0, map)
+
+    def step_due(self, due: np.ndarray, map: "Map"):
+        due = np.flatnonzero(due)
+        if len(due) == 0:
+            return
+        deltas = self.owed_time[due]
+        self.owed_time[due] = 0
+        self.step(due, deltas, map)
+
+    def step(self, shadows: np.ndarray, deltas: np.ndarray, map: "Map"):
+        """Advances the given shadows, each by its own time step."""
+        sim_rng = map.rng
+        grid = map.grid
+
+        # Shadows head for the crops along the flow field, one tile at a time. A long time step can take a
+        # shadow across several tiles, and it destroys what's on each of them on the way.
+        budgets = SHADOW_SPEED * deltas
+        following = np.zeros(len(shadows), dtype=bool)
+        hopping = np.arange(len(shadows))
+        while len(hopping) > 0:
+            indices = shadows[hopping]
+            next_tiles = map.flow_field.get_next_tiles((self.positions[indices, 0] // TILE_SIZE).astype(np.int64), (self.positions[indices, 1] // TILE_SIZE).astype(np.int64))
+            has_next = next_tiles >= 0
+            hopping, indices, next_tiles = hopping[has_next], indices[has_next], next_tiles[has_next]
+            following[hopping] = True
+
+            next_positions = np.stack(np.divmod(next_tiles, grid.height), axis=1) * TILE_SIZE
+            offsets = next_positions - self.positions[indices]
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+            arrived = budgets[hopping] >= distances
+            self.positions[indices[arrived]] = next_positions[arrived]
+            partial = ~arrived
+            self.positions[indices[partial]] += offsets[partial] * (budgets[hopping[partial]] / distances[partial])[:, None]
+            budgets[hopping] = np.where(arrived, budgets[hopping] - distances, 0)
+
+            self.destroy_structures(indices, grid)
+            hopping = hopping[arrived]
+        self.has_target[shadows[following]] = False
+
+        # The ones with nowhere to go wander. They move toward their targets, faster the further away they
+        # are, and the ones that arrived stop for this step.
+        wandering, deltas = shadows[~following], deltas[~following]
+        idle = ~self.has_target[wandering]
+        offsets = self.targets[wandering] - self.positions[wandering]
+        distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        moving = self.has_target[wandering] & (distances > 5)
+        self.has_target[wandering] = moving
+        steps = np.minimum(SHADOW_SPEED * deltas[moving] * np.maximum(1, distances[moving] / 10), distances[moving])
+        self.positions[wandering[moving]] += offsets[moving] * (steps / distances[moving])[:, None]
+
+        # Idle shadows sometimes pick a new target within MOVE_AMOUNT tiles, inside the farm. This is the
+        # chance of that at a rate of MOVE_CHANCE_PER_SECOND, for a step of any length.
+        retargeting = wandering[idle & (sim_rng.random(len(wandering)) < 1 - np.exp(-MOVE_CHANCE_PER_SECOND * deltas))]
+        if len(retargeting) > 0:
+            tiles = (self.positions[retargeting] // TILE_SIZE).astype(np.int64)
+            farm_start = np.array(FARMABLE_MAP_START)
+            farm_last = np.array(FARMABLE_MAP_END) - 1
+            low = np.clip(tiles - MOVE_AMOUNT, farm_start, farm_last)
+            high = np.clip(tiles + MOVE_AMOUNT, farm_start, farm_last)
+            self.targets[retargeting] = sim_rng.integers(low, high, endpoint=True) * TILE_SIZE
+            self.has_target[retargeting] = True
+
+        self.destroy_structures(wandering, grid)
+
+    def destroy_structures(self, shadows: np.ndarray, grid: TileGrid):
+        """The given shadows destroy any structure they're on, and bounce off walls."""
+        tile_x = (self.positions[shadows, 0] // TILE_SIZE).astype(np.int64)
+        tile_y = (self.positions[shadows, 1] // TILE_SIZE).astype(np.int64)
+        in_bounds = np.flatnonzero((tile_x >= 0) & (tile_x < grid.width) & (tile_y >= 0) & (tile_y < grid.height))
+        touching = in_bounds[grid.structures[tile_x[in_bounds], tile_y[in_bounds]] != StructureKind.NONE]
+        if len(touching) == 0:
+            return
+        # Only the first shadow on a tile finds its structure still there
+        _, first = np.unique(tile_x[touching] * grid.height + tile_y[touching], return_index=True)
+        for i in touching[np.sort(first)].tolist():
+            shadow, x, y = int(shadows[i]), int(tile_x[i]), int(tile_y[i])
+            if grid.structures[x, y] == StructureKind.WALL and self.has_target[shadow]:
+                self.targets[shadow] = ((2 * self.positions[shadow] - self.targets[shadow]) * 1.5).astype(np.int64)
+            grid.clear_structure(x, y)
+
+    def get_alpha_frame(self, frame_index: int, alpha: int) -> pygame.Surface:
+        frame = self.alpha_frames.get((frame_index, alpha))
+        if frame is None:
+            frame = self.alpha_frames[(frame_index, alpha)] = shadow_frames.get()[frame_index].copy()
+            frame.set_alpha(alpha)
+        return frame
+
+    def draw(self, win: pygame.Surface, camera_pos: pygame.Vector2, shown: np.ndarray, interpolation: float = 1):
+        """
+        Draws the shadows selected by the boolean mask shown, interpolation of the way from their previous
+        positions to their current ones.
+        """
+        indices = np.flatnonzero(shown)
+        if len(indices) == 0:
+            return
+        previous = self.previous_positions[indices]
+        positions = previous + (self.positions[indices] - previous) * interpolation
+        screen_x = positions[:, 0] - camera_pos.x + get_width() // 2
+        screen_y = positions[:, 1] - camera_pos.y + get_height() // 2
+        visible = (screen_x > -TILE_SIZE - SHADOW_SHAKE) & (screen_x < get_width() + SHADOW_SHAKE) & (screen_y > -TILE_SIZE - SHADOW_SHAKE) & (screen_y < get_height() + SHADOW_SHAKE)
+        indices, screen_x, screen_y = indices[visible], screen_x[visible], screen_y[visible]
+
+        count = len(indices)
+        frame_indices = (self.frame_offsets[indices] + sim_clock.get_ticks() * SHADOW_ANIMATION_FPS // 1000) % SHADOW_FRAME_COUNT
+        alphas = rng.choice(SHADOW_ALPHAS, size=count)
+        screen_x += rng.integers(-SHADOW_SHAKE, SHADOW_SHAKE, size=count, endpoint=True)
+        screen_y += rng.integers(-SHADOW_SHAKE, SHADOW_SHAKE, size=count, endpoint=True)
+        win.blits([
+            (self.get_alpha_frame(frame_index, alpha), (x, y))
+            for frame_index, alpha, x, y in zip(frame_indices.tolist(), alphas.tolist(), screen_x.tolist(), screen_y.tolist())
+        ], False)
@@ -0,0 +1,65 @@
+from enum import IntEnum
+
+import numpy as np
+import pygame
+
+from constants import SIM_ACTIVE_MARGIN, SIM_REDUCED_DISTANCE, SIM_REGION_SIZE, SIM_VIEW_HEIGHT, SIM_VIEW_WIDTH, TILE_SIZE
+
+class SimulationLevel(IntEnum):
+    # Simulated every frame
+    ACTIVE = 0
+    # Simulated every so often, with the time since the last update
+    REDUCED = 1
+    # Not simulated; it catches up on everything it missed once it's reduced or active again.
+    # Shadows are never dormant, since they only last a night; see ShadowSwarm.update
+    DORMANT = 2
+
+class SimulationLOD:
+    """
+    Divides the map into square regions of SIM_REGION_SIZE tiles, and decides how often each one is simulated
+    based on how far it is from the player's view (SIM_VIEW_WIDTH by SIM_VIEW_HEIGHT tiles around them). Whatever is simulated keeps track of how much time (or how
+    many map updates) each region or object is owed, and gets it all at once when its region is next updated,
+    so things far away happen in fewer, bigger steps instead of not happening.
+
+    Before the first update every region is active, e.g. when there's no player.
+    """
+    width: int
+    height: int
+    levels: np.ndarray # SimulationLevel values, indexed [region_x, region_y]
+
+    def __init__(self, map_width: int, map_height: int):
+        self.width = -(-map_width // SIM_REGION_SIZE)
+        self.height = -(-map_height // SIM_REGION_SIZE)
+        self.levels = np.full((self.width, self.height), SimulationLevel.ACTIVE, dtype=np.uint8)
+
+    def update(self, player_position: pygame.Vector2):
+        """Works out each region's level from the view around the player, which the camera follows."""
+        region_pixels = SIM_REGION_SIZE * TILE_SIZE
+        half_width = (SIM_VIEW_WIDTH / 2 + SIM_ACTIVE_MARGIN) * TILE_SIZE
+        half_height = (SIM_VIEW_HEIGHT / 2 + SIM_ACTIVE_MARGIN) * TILE_SIZE
+        min_x, max_x = player_position.x - half_width, player_position.x + half_width
+        min_y, max_y = player_position.y - half_height, player_position.y + half_height
+
+        # How many regions away from the active area each region is
+        region_x = np.arange(self.width)
+        region_y = np.arange(self.height)
+        distance_x = np.maximum(np.maximum(min_x // region_pixels - region_x, region_x - max_x // region_pixels), 0)
+        distance_y = np.maximum(np.maximum(min_y // region_pixels - region_y, region_y - max_y // region_pixels), 0)
+        distances = np.maximum.outer(distance_x, distance_y)
+
+        self.levels = np.where(distances == 0, SimulationLevel.ACTIVE, np.where(distances <= SIM_REDUCED_DISTANCE, SimulationLevel.REDUCED, SimulationLevel.DORMANT)).astype(np.uint8)
+
+    def get_levels(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Returns the levels at the given positions in pixels. Positions off the map use the nearest region."""
+        region_x = np.clip((x // (SIM_REGION_SIZE * TILE_SIZE)).astype(np.int64), 0, self.width - 1)
+        region_y = np.clip((y // (SIM_REGION_SIZE * TILE_SIZE)).astype(np.int64), 0, self.height - 1)
+        return self.levels[region_x, region_y]
+
+    def get_level(self, x: float, y: float) -> SimulationLevel:
+        region_x = min(max(int(x // (SIM_REGION_SIZE * TILE_SIZE)), 0), self.width - 1)
+        region_y = min(max(int(y // (SIM_REGION_SIZE * TILE_SIZE)), 0), self.height - 1)
+        return SimulationLevel(self.levels[region_x, region_y])
+
+    def is_due(self, levels: np.ndarray, owed: np.ndarray, reduced_interval: float) -> np.ndarray:
+        """Whether things at the given levels, owed the given time or updates, should be updated now."""
+        return (levels == SimulationLevel.ACTIVE) | ((levels == SimulationLevel.REDUCED) & (owed >= reduced_interval))
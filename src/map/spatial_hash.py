@@ -0,0 +1,85 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from map.entity import Entity
+
+type CellRange = tuple[int, int, int, int]
+
+class SpatialHash:
+    """
+    A uniform grid of square cells, each holding the entities whose bounds overlap it, so finding the entities
+    near a rectangle or point only looks at the cells around it instead of at every entity on the map.
+    Entities have to be moved in it whenever their bounds change.
+    """
+    cell_size: int
+    cells: dict[tuple[int, int], dict["Entity", None]]
+    # The cells each entity is in, as (min_x, min_y, max_x, max_y), inclusive
+    entity_cells: dict["Entity", CellRange]
+    # Queries return entities in the order they were added, so results don't depend on how they're hashed
+    order: dict["Entity", int]
+    added_count: int = 0
+
+    def __init__(self, cell_size: int):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.entity_cells = {}
+        self.order = {}
+
+    def __len__(self) -> int:
+        return len(self.entity_cells)
+
+    def __contains__(self, entity: "Entity") -> bool:
+        return entity in self.entity_cells
+
+    def get_cell_range(self, min_x: float, min_y: float, max_x: float, max_y: float) -> CellRange:
+        return (int(min_x // self.cell_size), int(min_y // self.cell_size), int(max_x // self.cell_size), int(max_y // self.cell_size))
+
+    def add_to_cells(self, entity: "Entity", cell_range: CellRange):
+        min_x, min_y, max_x, max_y = cell_range
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                self.cells.setdefault((x, y), {})[entity] = None
+        self.entity_cells[entity] = cell_range
+
+    def remove_from_cells(self, entity: "Entity", cell_range: CellRange):
+        min_x, min_y, max_x, max_y = cell_range
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                cell = self.cells[(x, y)]
+                del cell[entity]
+                if not cell:
+                    del self.cells[(x, y)]
+
+    def add(self, entity: "Entity"):
+        self.order[entity] = self.added_count
+        self.added_count += 1
+        self.add_to_cells(entity, self.get_cell_range(*entity.get_bounds()))
+
+    def remove(self, entity: "Entity"):
+        self.remove_from_cells(entity, self.entity_cells.pop(entity))
+        del self.order[entity]
+
+    def move(self, entity: "Entity"):
+        """Updates the cells an entity is in after it moved. Most moves stay within the same cells, which costs nothing."""
+        old_range = self.entity_cells[entity]
+        new_range = self.get_cell_range(*entity.get_bounds())
+        if new_range != old_range:
+            self.remove_from_cells(entity, old_range)
+            self.add_to_cells(entity, new_range)
+
+    def query_rect(self, min_x: float, min_y: float, max_x: float, max_y: float) -> list["Entity"]:
+        """
+        Returns the entities in the cells the rectangle touches, in the order they were added. That includes
+        every entity whose bounds overlap the rectangle, and possibly a few nearby ones that don't.
+        """
+        cell_min_x, cell_min_y, cell_max_x, cell_max_y = self.get_cell_range(min_x, min_y, max_x, max_y)
+        found: dict["Entity", None] = {}
+        for x in range(cell_min_x, cell_max_x + 1):
+            for y in range(cell_min_y, cell_max_y + 1):
+                cell = self.cells.get((x, y))
+                if cell is not None:
+                    found.update(cell)
+        return sorted(found, key=self.order.__getitem__)
+
+    def query_point(self, x: float, y: float) -> list["Entity"]:
+        return self.query_rect(x, y, x, y)
@@ -3,30 +3,45 @@ from enum import Enum, IntEnum, auto
 import random
 from typing import Optional, TYPE_CHECKING
 
+import numpy as np
 import pygame
 
+from assets import Asset, asset_manager, image_baker
 from audio import AudioManager, SoundType
-from constants import PARTICLES_PER_TILE_SECOND, TILE_SIZE
+from bundles import open_asset
+from constants import MAX_PLANT_GROWTH_STAGE, PARTICLES_PER_TILE_SECOND, TILE_SIZE
 from dialogue import DialogueManager, WorldEvent
+from graphics import effects_random
+from graphics.atlas import sprite_atlas
 from graphics.floating_hint_text import FloatingHintText, add_floating_text_hint
 from graphics.particles import spawn_particles_in_square
 from items import Item, ItemHarvestData
+from map.grid import StructureKind, TileGrid
 from utils import get_asset
 
 if TYPE_CHECKING:
     from player import Player
 
 class Structure(ABC):
-    should_destroy: bool = False
+    """
+    A view over the structure stored in a cell of the tile grid.
+    Structures don't hold any state themselves, so they can be created whenever they're needed.
+    """
+    grid: TileGrid
+    x: int
+    y: int
     
-    def __init__(self):
-        pass
+    def __init__(self, grid: TileGrid, x: int, y: int):
+        self.grid = grid
+        self.x = x
+        self.y = y
     
-    def destroy(self):
-        self.should_destroy = True
+    def remove(self):
+        """Removes this structure from its tile entirely."""
+        self.grid.clear_structure(self.x, self.y)
     
-    def random_tick(self, audio_manager: AudioManager, dialogue_manager: DialogueManager):
-        pass
+    def destroy(self):
+        self.remove()
     
     def get_interaction(self, item: Item, player: "Player", audio_manager: AudioManager, dialogue_manager: DialogueManager, tile_center_pos: tuple[int, int], rising_edge: bool):
         """
@@ -35,19 +50,19 @@ class Structure(ABC):
         """
         pass
     
-    def draw(self, win: pygame.Surface, x, y, tile_center_pos: tuple[int, int], delta: float):
+    def draw(self, blits: list[tuple[pygame.Surface, tuple[int, int], pygame.Rect]], x, y, tile_center_pos: tuple[int, int], delta: float):
         """
+        Adds the area blits that draw this structure to blits; they're all drawn at once by the map.
         x and y are screen coordinates, while tile_center_pos is the center of the tile in world coordinates.
         """
         pass
 
-plant_images = {
+plant_images: dict[Item, list[Asset[pygame.Surface]]] = {
     Item.CARROT_SEEDS: [],
     Item.WHEAT_SEEDS: [],
     Item.ONION_SEEDS: []
 }
 
-MAX_PLANT_GROWTH_STAGE = 2
 for plant_type in plant_images:
     plant_names = {
         Item.CARROT_SEEDS: "carrot",
@@ -55,48 +70,74 @@ for plant_type in plant_images:
         Item.ONION_SEEDS: "onion"
     }
     for i in range(MAX_PLANT_GROWTH_STAGE + 1):
-        image = pygame.image.load(get_asset("tiles", f"planted_{plant_names[plant_type]}_{i}.png")).convert_alpha()
-        image = pygame.transform.scale(image, (TILE_SIZE, TILE_SIZE))
-        plant_images[plant_type].append(image)
+        plant_images[plant_type].append(asset_manager.image("tiles", f"planted_{plant_names[plant_type]}_{i}.png", size=(TILE_SIZE, TILE_SIZE)))
 
-dry_soil_image = pygame.transform.scale(
-    pygame.image.load(get_asset("tiles", "farmland.png")).convert_alpha(),
-    (TILE_SIZE, TILE_SIZE)
-)
-wet_soil_image = pygame.transform.scale(
-    pygame.image.load(get_asset("tiles", "wet_farmland.png")).convert_alpha(),
-    (TILE_SIZE, TILE_SIZE)
-)
+dry_soil_image = asset_manager.image("tiles", "farmland.png", size=(TILE_SIZE, TILE_SIZE))
+wet_soil_image = asset_manager.image("tiles", "wet_farmland.png", size=(TILE_SIZE, TILE_SIZE))
 
-wall_images = [pygame.transform.scale(
-    pygame.image.load(get_asset("tiles", f"wall{idx}.png")).convert_alpha(),
-    (TILE_SIZE, TILE_SIZE)
-) for idx in range(3)]
+wall_images = [asset_manager.image("tiles", f"wall{idx}.png", size=(TILE_SIZE, TILE_SIZE)) for idx in range(3)]
 
 class SoilStructure(Structure):
     """
     Soil structures can have plants growing on them.
     """
-    item: Optional[Item]
-    growth_stage: int = 0
-    wet: bool = False
     
-    def __init__(self, item: Optional[Item]):
-        self.item = item
+    @property
+    def item(self) -> Optional[Item]:
+        crop = self.grid.crops[self.x, self.y]
+        return Item(int(crop)) if crop != 0 else None
+    @item.setter
+    def item(self, item: Optional[Item]):
+        self.grid.crops[self.x, self.y] = item.value if item != None else 0
+        self.grid.update_ticking(self.x, self.y)
+    
+    @property
+    def growth_stage(self) -> int:
+        return int(self.grid.growth_stages[self.x, self.y])
+    @growth_stage.setter
+    def growth_stage(self, growth_stage: int):
+        self.grid.growth_stages[self.x, self.y] = growth_stage
+        self.grid.update_ticking(self.x, self.y)
+    
+    @property
+    def wet(self) -> bool:
+        return bool(self.grid.wet[self.x, self.y])
+    @wet.setter
+    def wet(self, wet: bool):
+        self.grid.wet[self.x, self.y] = wet
     
-    def random_tick(self, audio_manager: AudioManager, dialogue_manager: DialogueManager):
-        if self.item != None and self.growth_stage < MAX_PLANT_GROWTH_STAGE:
-            if not self.wet:
-                if random.random() <= 0.5:
-                    return
-            else:
-                if random.random() <= 0.1:
-                    self.wet = False
-            self.growth_stage += 1
+    @staticmethod
+    def random_tick_batch(grid: TileGrid, indices: np.ndarray, tick_counts: np.ndarray, rng: np.random.Generator, dialogue_manager: DialogueManager):
+        """
+        Applies random ticks to many growing soil tiles at once. indices are flat tile indices from grid.ticking,
+        and tick_counts is how many random ticks each of them received. Ticks on the same tile are applied in order,
+        so a tile that gets several ticks behaves exactly as if it had been ticked that many times.
+        """
+        ticked = tick_counts > 0
+        indices, tick_counts = indices[ticked], tick_counts[ticked]
+        xs, ys = np.divmod(indices, grid.height)
+        
+        fully_grown = False
+        for tick in range(int(tick_counts.max(initial=0))):
+            ticking = tick_counts > tick
+            x, y = xs[ticking], ys[ticking]
+            growing = grid.growth_stages[x, y] < MAX_PLANT_GROWTH_STAGE
+            x, y = x[growing], y[growing]
+            
+            # Dry soil only grows half the time, while wet soil always grows but has a chance of drying out
+            wet = grid.wet[x, y]
+            roll = rng.random(len(x))
+            grows = wet | (roll > 0.5)
+            grid.wet[x, y] = wet & (roll > 0.1)
             
-            if self.growth_stage == MAX_PLANT_GROWTH_STAGE and not dialogue_manager.condition_state.has_event(WorldEvent.FullyGrownPlant):
-                dialogue_manager.condition_state.add_event(WorldEvent.FullyGrownPlant)
-            # audio_manager.play_sound(SoundType.PLANT) # TODO: Better growth sound
+            grid.growth_stages[x[grows], y[grows]] += 1
+            fully_grown |= bool((grid.growth_stages[x, y] == MAX_PLANT_GROWTH_STAGE).any())
+        
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            grid.update_ticking(x, y)
+        
+        if fully_grown and not dialogue_manager.condition_state.has_event(WorldEvent.FullyGrownPlant):
+            dialogue_manager.condition_state.add_event(WorldEvent.FullyGrownPlant)
     
     def destroy(self):
         if self.item:
@@ -160,12 +201,14 @@ class SoilStructure(Structure):
         
         return None
     
-    def draw(self, win: pygame.Surface, x: int, y: int, tile_center_pos: tuple[int, int], delta: float):
-        win.blit(wet_soil_image if self.wet else dry_soil_image, (x, y))
+    def draw(self, blits: list[tuple[pygame.Surface, tuple[int, int], pygame.Rect]], x: int, y: int, tile_center_pos: tuple[int, int], delta: float):
+        soil = sprite_atlas.get_image(wet_soil_image if self.wet else dry_soil_image)
+        blits.append((soil.page, (x, y), soil.rect))
         if self.item != None:
-            win.blit(plant_images[self.item][self.growth_stage], (x, y))
+            plant = sprite_atlas.get_image(plant_images[self.item][self.growth_stage])
+            blits.append((plant.page, (x, y), plant.rect))
         
-        if self.item != None and self.growth_stage == MAX_PLANT_GROWTH_STAGE and random.random() < delta * PARTICLES_PER_TILE_SECOND:
+        if self.item != None and self.growth_stage == MAX_PLANT_GROWTH_STAGE and effects_random.random() < delta * PARTICLES_PER_TILE_SECOND:
             plant_particle_colors = {
                 Item.CARROT_SEEDS: "orange",
                 Item.WHEAT_SEEDS: "yellow",
@@ -178,7 +221,12 @@ class WallStructure(Structure):
     A wall that progressively gets damaged. Can be destroyed with an axe.
     """
     
-    damage: int = 0
+    @property
+    def damage(self) -> int:
+        return int(self.grid.wall_damage[self.x, self.y])
+    @damage.setter
+    def damage(self, damage: int):
+        self.grid.wall_damage[self.x, self.y] = damage
     
     def destroy(self, player: "Player", audio_manager: AudioManager, tile_center_pos: tuple[int, int]):
         self.damage += 1
@@ -187,7 +235,7 @@ class WallStructure(Structure):
         
         if self.damage == 3:
             add_floating_text_hint(FloatingHintText(f"Wall destroyed!", tile_center_pos, "white"))
-            super().destroy()
+            self.remove()
         else:
             add_floating_text_hint(FloatingHintText(f"Wall damaged!", tile_center_pos, "white"))
         
@@ -198,33 +246,39 @@ class WallStructure(Structure):
             return lambda: self.destroy(player, audio_manager, tile_center_pos)
         return None
     
-    def draw(self, win: pygame.Surface, x: int, y: int, tile_center_pos: tuple[int, int], delta: float):
-        win.blit(wall_images[self.damage], (x, y))
+    def draw(self, blits: list[tuple[pygame.Surface, tuple[int, int], pygame.Rect]], x: int, y: int, tile_center_pos: tuple[int, int], delta: float):
+        wall = sprite_atlas.get_image(wall_images[self.damage])
+        blits.append((wall.page, (x, y), wall.rect))
 
 class TileType(Enum):
     """
     Tiles with a higher layer are drawn on top of earlier ones.
     """
-    WATER = "water_tilemap.png", 0
+    WATER = "water_tilemap.png", 0, True
     OUTSIDE_FARM_DIRT = "outside_farm_dirt_tilemap.png", 1
     SOIL = "dirt_tilemap.png", 2
     GRASS = "grass_tilemap.png", 3
     TALL_GRASS = "tall_grass_tilemap.png", 4
     
     path: str
-    atlas: list[pygame.Surface]
+    atlas_asset: Asset[list[pygame.Surface]]
     layer: int
+    collidable: bool
 
     def __new__(cls, *args, **kwds):
         value = len(cls.__members__) + 1
         obj = object.__new__(cls)
         obj._value_ = value
         return obj
-    def __init__(self, image_name: str, layer: int):
+    def __init__(self, image_name: str, layer: int, collidable: bool = False):
         self.path = get_asset("tiles", image_name)
         self.layer = layer
-        
-        tilemap_image = pygame.image.load(self.path).convert_alpha()
+        self.collidable = collidable
+        self.atlas_asset = asset_manager.load(f"atlas:{self.path}", lambda: pygame.image.load(open_asset(self.path), self.path), self.make_atlas, self.path, image_baker)
+    
+    @staticmethod
+    def make_atlas(tilemap_image: pygame.Surface) -> list[pygame.Surface]:
+        tilemap_image = tilemap_image.convert_alpha()
         tilemap_atlas = []
         # For each of the 16 possible combinations of yes/no for the 4 corners of a tile,
         # we fill the tilemap atlas position 0b(top left)(top right)(bottom left)(bottom right)
@@ -256,44 +310,59 @@ class TileType(Enum):
             atlas_image = tilemap_image.subsurface(pos[0] * image_size // 4, pos[1] * image_size // 4, image_size // 4, image_size // 4)
             atlas_image = pygame.transform.scale(atlas_image, (TILE_SIZE, TILE_SIZE))
             tilemap_atlas.append(atlas_image)
-        self.atlas = tilemap_atlas
+        return tilemap_atlas
 
 class Tile:
-    structure: Optional[Structure]
-    tile_type: TileType
-    collidable: bool = False
+    """A view over a single cell of the tile grid."""
+    grid: TileGrid
+    x: int
+    y: int
     
-    def __init__(self, tile_type: TileType):
-        self.structure = None
-        self.tile_type = tile_type
-        self.collidable = self.tile_type in [TileType.WATER]
+    def __init__(self, grid: TileGrid, x: int, y: int):
+        self.grid = grid
+        self.x = x
+        self.y = y
+    
+    @property
+    def tile_type(self) -> TileType:
+        return TileType(int(self.grid.tile_types[self.x, self.y]))
+    @tile_type.setter
+    def tile_type(self, tile_type: TileType):
+        self.grid.set_tile_type(self.x, self.y, tile_type.value, tile_type.collidable)
+    
+    @property
+    def structure(self) -> Optional[Structure]:
+        match self.grid.structures[self.x, self.y]:
+            case StructureKind.SOIL:
+                return SoilStructure(self.grid, self.x, self.y)
+            case StructureKind.WALL:
+                return WallStructure(self.grid, self.x, self.y)
+            case _:
+                return None
 
     def is_collidable(self):
-        return self.collidable
+        return bool(self.grid.collidable[self.x, self.y])
     
-    def draw(self, win: pygame.Surface, x: int, y: int, tile_center_pos: tuple[int, int], delta: float):
+    def draw(self, blits: list[tuple[pygame.Surface, tuple[int, int], pygame.Rect]], x: int, y: int, tile_center_pos: tuple[int, int], delta: float):
         """
-        Draws everything on this tile, but not the tile itself.
+        Adds the blits that draw everything on this tile, but not the tile itself.
         Tile rendering uses a dual-grid system, so it's handled at the map level.
         x and y are screen coordinates, while tile_center_pos is the center of the tile in world coordinates.
         """
-        if self.structure and not self.structure.should_destroy:
-            self.structure.draw(win, x, y, tile_center_pos, delta)
+        if structure := self.structure:
+            structure.draw(blits, x, y, tile_center_pos, delta)
     
-    def set_structure(self, structure: Structure):
-        if self.structure and not self.structure.should_destroy:
-            self.structure.destroy()
-        
-        self.structure = structure
+    def set_structure(self, kind: StructureKind):
+        self.grid.set_structure(self.x, self.y, kind)
     
     def wall_placed(self, player: "Player", tile_center_pos: tuple[int, int], audio_manager: AudioManager):
-        self.set_structure(WallStructure())
+        self.set_structure(StructureKind.WALL)
         audio_manager.play_sound(SoundType.PLANT) # TODO: Wall place sound
         player.decrement_selected_item_quantity()
         add_floating_text_hint(FloatingHintText(f"Wall placed!", tile_center_pos, "white"))    
     
     def tilled(self, tile_center_pos: tuple[int, int], audio_manager: AudioManager, dialogue_manager: DialogueManager):
-        self.set_structure(SoilStructure(None))
+        self.set_structure(StructureKind.SOIL)
         audio_manager.play_sound(SoundType.TILL_SOIL)
         add_floating_text_hint(FloatingHintText(f"Tilled soil!", tile_center_pos, "white"))
         dialogue_manager.condition_state.add_event(WorldEvent.TillHintDone)
@@ -316,10 +385,8 @@ class Tile:
         or None if no interaction should occur.
         """
         
-        if self.structure and self.structure.should_destroy:
-            self.structure = None
-        if self.structure:
-            return self.structure.get_interaction(item, player, audio_manager, dialogue_manager, tile_center_pos, rising_edge)
+        if structure := self.structure:
+            return structure.get_interaction(item, player, audio_manager, dialogue_manager, tile_center_pos, rising_edge)
         
         match (self.tile_type, item):
             case (TileType.SOIL, Item.HOE):
@@ -334,7 +401,3 @@ class Tile:
                 pass
         
         return None
-    
-    def random_tick(self, audio_manager: AudioManager, dialogue_manager: DialogueManager):
-        if self.structure:
-            self.structure.random_tick(audio_manager, dialogue_manager)
\ No newline at end of file
@@ -1,5 +1,6 @@
 from typing import Optional
 import pygame
+from assets import Asset, asset_manager
 from constants import TILE_SIZE
 from map import MAP_WIDTH, MAP_HEIGHT, Map
 from items import Item, render_item_slot, get_slot_bounds
@@ -7,17 +8,19 @@ from graphics import get_height, get_width
 from graphics.floating_hint_text import add_floating_text_hint, FloatingHintText
 import math
 
-from utils import get_asset, lerp
+from utils import lerp
 
 class Player:
     pos: pygame.Vector2
+    # Where the player was before the last update, for drawing between simulation steps
+    previous_pos: pygame.Vector2
     radius: int
     speed: int
     
-    image_horizontal: pygame.Surface
-    image_down: pygame.Surface
-    image_up: pygame.Surface
-    dir_image: pygame.Surface
+    image_horizontal: Asset[pygame.Surface]
+    image_down: Asset[pygame.Surface]
+    image_up: Asset[pygame.Surface]
+    dir_image: Asset[pygame.Surface]
     current_image: Optional[pygame.Surface] = None
     flipped: bool = False
     
@@ -43,12 +46,13 @@ class Player:
     
     def __init__(self, x, y, r=16):
         self.pos = pygame.Vector2(x, y)
+        self.previous_pos = self.pos.copy()
         self.radius = r
         self.speed = 300 # Pixels per second
 
-        self.image_horizontal = pygame.transform.scale(img := pygame.image.load(get_asset("sprites", "player_walk.png")).convert_alpha(), (img.get_width() * 4, img.get_height() * 4))
-        self.image_down = pygame.transform.scale(img := pygame.image.load(get_asset("sprites", "player_walk_down.png")).convert_alpha(), (img.get_width() * 4, img.get_height() * 4))
-        self.image_up = pygame.transform.scale(img := pygame.image.load(get_asset("sprites", "player_walk_up.png")).convert_alpha(), (img.get_width() * 4, img.get_height() * 4))
+        self.image_horizontal = asset_manager.image("sprites", "player_walk.png", scale=4)
+        self.image_down = asset_manager.image("sprites", "player_walk_down.png", scale=4)
+        self.image_up = asset_manager.image("sprites", "player_walk_up.png", scale=4)
         self.dir_image = self.image_horizontal
 
         for item in Item:
@@ -103,12 +107,18 @@ class Player:
         )
         add_floating_text_hint(self.slot_selection_floating_text)
     
+    def teleport(self, x, y):
+        self.pos = pygame.Vector2(x, y)
+        # Otherwise it gets drawn sliding across the map until the next update
+        self.previous_pos = self.pos.copy()
+    
     def force_walk_toward(self, x, y):
         self.force_walking_toward = pygame.Vector2(x, y)
     def stop_force_walk(self):
         self.force_walking_toward = None
     
     def update(self, movement_x: float, movement_y: float, farm: Map, delta: float):
+        self.previous_pos = self.pos.copy()
         if self.force_walking_toward != None:
             move = self.force_walking_toward - self.pos
             if move.magnitude() < self.speed * delta * 1.5:
@@ -133,7 +143,7 @@ class Player:
         if self.animation_timer >= 0.20:
             self.animation_timer -= 0.20
             self.animation_frame = (self.animation_frame + 1) % 4
-        self.current_image = self.dir_image.subsurface((64 * self.animation_frame, 0, 64, 128))
+        self.current_image = self.dir_image.get().subsurface((64 * self.animation_frame, 0, 64, 128))
 
         if move.magnitude() > 0:
             self.target_angle = 270 - math.degrees(math.atan2(move.y, move.x))
@@ -190,7 +200,7 @@ class Player:
             for y in range(min_tile_y, max_tile_y+1):
                 if map.is_collision(x, y):
                     return True
-        for entity in map.entities:
+        for entity in map.get_entities_in_rect(min_x, min_y, max_x, max_y):
             rect = entity.get_collision_rect()
             if rect == None:
                 continue
@@ -205,10 +215,8 @@ class Player:
                 return True
         return False
 
-    def mouse_down(self):
+    def mouse_down(self, x, y):
         """Returns if an interaction was inventory registered"""
-        x, y = pygame.mouse.get_pos()
-        
         for i in range(len(self.get_interactable_items())):
             if pygame.Rect(get_slot_bounds(i, 0, True, True)).collidepoint((x, y)):
                 self.select_slot(i)
@@ -235,9 +243,14 @@ class Player:
     def get_non_interactable_items(self):
         return [items for items in self.get_item_list() if not items[0].interactable]
 
-    def draw_player(self, win, camera_pos):
+    def get_draw_pos(self, interpolation: float) -> pygame.Vector2:
+        """Where to draw the player, interpolation of the way from its previous position to its current one."""
+        return self.previous_pos.lerp(self.pos, interpolation)
+
+    def draw_player(self, win, camera_pos, interpolation: float = 1):
         if self.current_image != None:
-            win.blit(t := pygame.transform.flip(self.current_image, self.flipped, False), (self.pos.x + get_width() // 2 - t.get_width() // 2 - camera_pos.x, self.pos.y + get_height() // 2 - t.get_height() // 2 - camera_pos.y - self.radius))
+            pos = self.get_draw_pos(interpolation)
+            win.blit(t := pygame.transform.flip(self.current_image, self.flipped, False), (pos.x + get_width() // 2 - t.get_width() // 2 - camera_pos.x, pos.y + get_height() // 2 - t.get_height() // 2 - camera_pos.y - self.radius))
     
     def draw_ui(self, win):
         for i, (item, amount) in enumerate(self.get_non_interactable_items()):
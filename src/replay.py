@@ -0,0 +1,133 @@
+"""
+Records the inputs of a play session to a file and plays them back, frame by frame.
+Together with seeding every source of randomness and running on the simulated clock, a replay goes
+through exactly the same game states as the recorded session, which makes frame times comparable
+between runs (e.g. before and after a change). The UI is laid out for the window's size and mouse positions
+are recorded in pixels, so the window keeps the recorded size while recording and replaying.
+
+File format (gzip-compressed, little-endian):
+    header: magic, format version, random seed, window width and height
+    per frame: delta, movement x/y, target x/y, mouse x/y, input flags, number of inputs, then one
+               byte per input the game dispatched that frame (an InputType value, or DIALOGUE_CONFIRM)
+"""
+
+import gzip
+import random
+import struct
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+from audio import sound_random
+from graphics import effects_random
+import graphics.particles
+import map.shadow_swarm
+import sim_clock
+
+if TYPE_CHECKING:
+    from game import Game
+
+MAGIC = b"FGRP"
+VERSION = 2
+
+HEADER = struct.Struct("<4sHQHH")
+FRAME = struct.Struct("<d4d2hBB")
+
+# Dispatched inputs that aren't an InputType; InputType values start at 1
+DIALOGUE_CONFIRM = 0
+
+FLAG_CLICKING = 1 << 0
+FLAG_INTERACTING = 1 << 1
+FLAG_CLICK_RISING_EDGE = 1 << 2
+
+def seed_game(game: "Game", seed: int):
+    """Seeds everything random in the game and switches to the simulated clock."""
+    random.seed(seed)
+    effects_random.seed(seed + 1)
+    sound_random.seed(seed + 2)
+    graphics.particles.rng = np.random.default_rng(seed + 3)
+    map.shadow_swarm.rng = np.random.default_rng(seed + 4)
+    game.playing_game_scene.farm.rng = np.random.default_rng(seed)
+    sim_clock.use_simulated_time()
+
+class ReplayFrame:
+    delta: float
+    input_state: tuple[float, float, float, float, int, int, bool, bool, bool]
+    # Dispatched inputs, in order
+    input_codes: bytes
+
+    def __init__(self, delta: float, input_state: tuple, input_codes: bytes):
+        self.delta = delta
+        self.input_state = input_state
+        self.input_codes = input_codes
+
+class InputRecorder:
+    seed: int
+    window_size: tuple[int, int]
+    frame_count: int = 0
+
+    def __init__(self, path: str, window_size: tuple[int, int], seed: Optional[int] = None):
+        self.seed = seed if seed is not None else random.SystemRandom().getrandbits(63)
+        self.window_size = window_size
+        self.file = gzip.open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.seed, *window_size))
+
+    def record_frame(self, delta: float, input_state: tuple, input_codes: list[int]):
+        movement_x, movement_y, target_x, target_y, mouse_x, mouse_y, clicking, interacting, click_rising_edge = input_state
+        flags = (FLAG_CLICKING if clicking else 0) | (FLAG_INTERACTING if interacting else 0) | (FLAG_CLICK_RISING_EDGE if click_rising_edge else 0)
+        # More than 255 inputs in a single frame isn't something a person can do, but don't write a broken file if it happens
+        input_codes = input_codes[:255]
+
+        self.file.write(FRAME.pack(delta, movement_x, movement_y, target_x, target_y, mouse_x, mouse_y, flags, len(input_codes)))
+        self.file.write(bytes(input_codes))
+        self.frame_count += 1
+
+    def close(self):
+        self.file.close()
+
+class InputReplayer:
+    seed: int
+    window_size: tuple[int, int]
+    frame_count: int = 0
+    # Wall time spent on each replayed frame, in seconds
+    frame_times: list[float]
+
+    def __init__(self, path: str):
+        self.file = gzip.open(path, "rb")
+        magic, version, self.seed, width, height = HEADER.unpack(self.file.read(HEADER.size))
+        self.window_size = (width, height)
+        if magic != MAGIC:
+            raise ValueError(f"{path} isn't an input recording")
+        if version != VERSION:
+            raise ValueError(f"{path} is a version {version} recording, but only version {VERSION} is supported")
+        self.frame_times = []
+
+    def next_frame(self) -> Optional[ReplayFrame]:
+        """Returns the next recorded frame, or None once the recording has ended."""
+        data = self.file.read(FRAME.size)
+        if len(data) < FRAME.size:
+            return None
+
+        delta, movement_x, movement_y, target_x, target_y, mouse_x, mouse_y, flags, input_count = FRAME.unpack(data)
+        input_codes = self.file.read(input_count)
+        self.frame_count += 1
+        return ReplayFrame(delta, (
+            movement_x, movement_y, target_x, target_y, mouse_x, mouse_y,
+            bool(flags & FLAG_CLICKING), bool(flags & FLAG_INTERACTING), bool(flags & FLAG_CLICK_RISING_EDGE)
+        ), input_codes)
+
+    def write_frame_times(self, path: str):
+        """Writes the frame times in milliseconds, one per line, so runs can be compared."""
+        with open(path, "w") as file:
+            for frame_time in self.frame_times:
+                file.write(f"{frame_time * 1000:.4f}\n")
+
+    def get_frame_time_summary(self) -> str:
+        if not self.frame_times:
+            return "No frames replayed"
+        times = np.array(self.frame_times) * 1000
+        p50, p95, p99 = np.percentile(times, [50, 95, 99])
+        return f"{len(times)} frames | mean {times.mean():.2f}ms | p50 {p50:.2f}ms | p95 {p95:.2f}ms | p99 {p99:.2f}ms | max {times.max():.2f}ms"
+
+    def close(self):
+        self.file.close()
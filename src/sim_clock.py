@@ -0,0 +1,36 @@
+"""
+The clock that game logic runs on. Anything that affects the simulation should get the time from here
+instead of calling pygame.time.get_ticks() directly, so the clock can be swapped for a simulated one
+that only advances with each simulation step. main.py switches to it when the game starts, so the real clock
+is only used before then.
+"""
+
+from typing import Optional
+import pygame
+
+# Milliseconds of simulated time, or None when following the real clock
+simulated_ticks: Optional[float] = None
+
+def get_ticks() -> int:
+    """Returns the number of milliseconds since the game started, like pygame.time.get_ticks()."""
+    if simulated_ticks is None:
+        return pygame.time.get_ticks()
+    return int(simulated_ticks)
+
+def is_simulated() -> bool:
+    return simulated_ticks is not None
+
+def use_simulated_time(start_ms: float = 0):
+    """Switches to a simulated clock that only moves forward when advance() is called."""
+    global simulated_ticks
+    simulated_ticks = start_ms
+
+def use_real_time():
+    global simulated_ticks
+    simulated_ticks = None
+
+def advance(seconds: float):
+    """Advances the simulated clock. Does nothing when following the real clock."""
+    global simulated_ticks
+    if simulated_ticks is not None:
+        simulated_ticks += seconds * 1000
@@ -18,7 +18,12 @@ def get_username():
         return "Player"
 
     import os
-    return os.getlogin()
+    try:
+        return os.getlogin()
+    except OSError:
+        # There's no controlling terminal, e.g. when running headless on CI
+        import getpass
+        return getpass.getuser()
 
 def get_asset(*path: list[str]) -> str:
     if is_web():
@@ -0,0 +1,53 @@
+"""
+Bakes every image the game loads into assets/baked, already cut and scaled to the size it's drawn at,
+and every sound as raw samples in the mixer's format, so the game can skip decoding them. Run it again
+after changing any asset, TILE_SIZE/ITEM_SLOT_ITEM_SIZE or the mixer settings; until then, the game just
+loads the changed assets the slow way.
+"""
+
+import os, sys
+from os import path
+
+# These have to be set before pygame is initialized
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+root = path.normpath(path.join(path.dirname(__file__), ".."))
+sys.path.insert(0, path.join(root, "src"))
+# get_asset paths are relative to the repository root
+os.chdir(root)
+
+import pygame
+
+pygame.mixer.pre_init(44100, -16, 2, 512)
+pygame.init()
+
+from assets import asset_manager
+from game import Game
+from utils import get_asset
+
+# Some assets are only registered when the game objects that use them are created
+Game()
+
+baked_path = get_asset("baked")
+os.makedirs(baked_path, exist_ok=True)
+
+baked_files = set()
+for asset in list(asset_manager.assets.values()):
+    if asset.baker is None:
+        continue
+
+    file = asset.baker.get_path(asset.key, asset.source)
+    baked_files.add(path.basename(file))
+    if asset.baker.read(file) is not None:
+        continue
+
+    print(f"Baking {asset.key}")
+    asset.baker.write(file, asset.load_live())
+
+for file in os.listdir(baked_path):
+    if file not in baked_files:
+        print(f"Removing stale {file}")
+        os.remove(path.join(baked_path, file))
+
+print(f"{len(baked_files)} baked assets in {baked_path}")
@@ -1,35 +1,199 @@
+"""
+Builds src/web_assets for the web version: WAVs are converted to OGG, and those and the other assets are
+packed into a few bundles (see src/bundles.py), since each file is a separate request on the web.
+
+Builds are incremental. Converted files are kept in build/web_assets, and build/web_prep_manifest.json
+records a hash of every input; only the inputs that changed (or whose output is missing) are rebuilt,
+spread across a process pool, and only the bundles they're in are packed again. Outputs whose source was
+removed are deleted. Every run writes build/web_prep_report.txt with how long each rebuilt file took and
+how big it and each bundle is.
+"""
+
+import hashlib
+import json
 import os, sys, shutil
-from pydub import AudioSegment
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 import glob
 from os import path
 
-lc = lambda x: len(open(x).readlines())
+root = path.normpath(path.join(path.dirname(__file__), ".."))
+sys.path.insert(0, path.join(root, "src"))
 
-base_assets = path.normpath(path.join(path.dirname(__file__), "..", "assets"))
+from bundles import Bundle
+
+base_assets = path.join(root, "assets")
 pattern = base_assets + '/**/*'
-web_assets_path = path.normpath(path.join(path.dirname(__file__), "..", "src", "web_assets"))
-
-for file in glob.glob(pattern, recursive=True):
-    extension = path.splitext(file)[1]
-    if extension not in [".wav", ".png", ".ttf"]:
-        continue
-    
-    if extension == ".wav":
-        new_path = path.join(web_assets_path, path.relpath(file, base_assets))
-        new_path = new_path[:-4] + ".ogg"
-        if os.path.exists(new_path):
-            continue
-        
-        print(f"Converting {file} to {new_path}")
-        audio_segment = AudioSegment.from_wav(file)
-        os.makedirs(path.dirname(new_path), exist_ok=True)
-        audio_segment.export(new_path, format="ogg")
+bundles_path = path.join(root, "src", "web_assets")
+build_path = path.join(root, "build")
+web_assets_path = path.join(build_path, "web_assets")
+manifest_path = path.join(build_path, "web_prep_manifest.json")
+report_path = path.join(build_path, "web_prep_report.txt")
+
+EXTENSIONS = [".wav", ".png", ".ttf"]
+# Bump this whenever the way files are built changes, so everything is rebuilt
+PIPELINE_VERSION = 2
+
+# In the order the game needs them: the main menu only needs the font and UI, and sounds are loaded as they're played
+BUNDLES = ["menu.bundle", "game.bundle", "audio.bundle"]
+
+def get_bundle(output: str) -> str:
+    if output.endswith(".ttf") or output.startswith("ui/"):
+        return "menu.bundle"
+    if output.startswith("audio/"):
+        return "audio.bundle"
+    return "game.bundle"
+
+def hash_file(file: str) -> str:
+    with open(file, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def get_output(source: str) -> str:
+    """Returns the output path for a source path, both relative to their asset folders."""
+    if source.endswith(".wav"):
+        return source[:-4] + ".ogg"
+    return source
+
+def build_file(source: str, output: str) -> tuple[float, int]:
+    """Builds a single file. Runs in a worker process; returns how long it took and the output size."""
+    start = time.perf_counter()
+    source_path = path.join(base_assets, source)
+    output_path = path.join(web_assets_path, output)
+    os.makedirs(path.dirname(output_path), exist_ok=True)
+
+    if source.endswith(".wav"):
+        # Only needed when there's audio to convert
+        from pydub import AudioSegment
+        AudioSegment.from_wav(source_path).export(output_path, format="ogg")
     else:
-        new_path = path.join(web_assets_path, path.relpath(file, base_assets))
-        if os.path.exists(new_path):
+        shutil.copy(source_path, output_path)
+    return time.perf_counter() - start, path.getsize(output_path)
+
+def load_manifest() -> dict:
+    empty = {"version": PIPELINE_VERSION, "files": {}, "bundles": {}}
+    try:
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return empty
+    if manifest.get("version") != PIPELINE_VERSION:
+        return empty
+    return manifest
+
+def pack_bundle(name: str, outputs: list[str]) -> int:
+    files = {}
+    for output in outputs:
+        with open(path.join(web_assets_path, output), "rb") as file:
+            files[output] = file.read()
+    data = Bundle.pack(files)
+    with open(path.join(bundles_path, name), "wb") as file:
+        file.write(data)
+    return len(data)
+
+def main():
+    start = time.perf_counter()
+    manifest = load_manifest()
+    old_files: dict[str, dict] = manifest["files"]
+
+    sources = sorted(
+        path.relpath(file, base_assets).replace(os.sep, "/")
+        for file in glob.glob(pattern, recursive=True)
+        if path.splitext(file)[1] in EXTENSIONS
+    )
+    hashes = {source: hash_file(path.join(base_assets, source)) for source in sources}
+
+    to_build = [
+        source for source in sources
+        if source not in old_files
+        or old_files[source]["hash"] != hashes[source]
+        or not path.exists(path.join(web_assets_path, get_output(source)))
+    ]
+
+    results: dict[str, tuple[float, int]] = {}
+    failed: dict[str, str] = {}
+    with ProcessPoolExecutor() as executor:
+        futures = {source: executor.submit(build_file, source, get_output(source)) for source in to_build}
+        for source, future in futures.items():
+            try:
+                results[source] = future.result()
+                print(f"Built {source} -> {get_output(source)}")
+            except Exception as error:
+                failed[source] = str(error)
+                print(f"Failed to build {source}: {error}")
+
+    # Outputs whose source is gone, or that nothing produces anymore
+    expected_outputs = {get_output(source) for source in sources}
+    removed = []
+    for file in glob.glob(web_assets_path + '/**/*', recursive=True):
+        output = path.relpath(file, web_assets_path).replace(os.sep, "/")
+        if path.isfile(file) and output not in expected_outputs:
+            os.remove(file)
+            removed.append(output)
+            print(f"Removed orphan {output}")
+
+    # A bundle is packed again if anything in it changed; its hash covers which files it has and their hashes
+    bundle_contents: dict[str, list[str]] = {name: [] for name in BUNDLES}
+    for source in sources:
+        if source not in failed:
+            bundle_contents[get_bundle(get_output(source))].append(source)
+    os.makedirs(bundles_path, exist_ok=True)
+    old_bundles: dict[str, dict] = manifest["bundles"]
+    new_bundles = {}
+    packed = []
+    for name, bundle_sources in bundle_contents.items():
+        bundle_hash = hashlib.sha256(json.dumps([[source, hashes[source]] for source in bundle_sources]).encode()).hexdigest()
+        old_bundle = old_bundles.get(name)
+        if old_bundle is not None and old_bundle["hash"] == bundle_hash and path.exists(path.join(bundles_path, name)):
+            new_bundles[name] = old_bundle
             continue
-        
-        print(f"Copying {file} to {new_path}")
-        os.makedirs(path.dirname(new_path), exist_ok=True)
-        shutil.copy(file, new_path)
\ No newline at end of file
+        size = pack_bundle(name, [get_output(source) for source in bundle_sources])
+        new_bundles[name] = {"hash": bundle_hash, "bytes": size}
+        packed.append(name)
+        print(f"Packed {name} with {len(bundle_sources)} files")
+
+    with open(path.join(bundles_path, "bundles.json"), "w") as file:
+        json.dump({
+            "bundles": BUNDLES,
+            "files": {get_output(source): get_bundle(get_output(source)) for source in sources if source not in failed}
+        }, file, indent=1)
+
+    for file in os.listdir(bundles_path):
+        if file not in BUNDLES and file != "bundles.json":
+            os.remove(path.join(bundles_path, file))
+            removed.append(f"web_assets/{file}")
+            print(f"Removed orphan web_assets/{file}")
+
+    # Failed files aren't recorded, so they're tried again next time
+    new_files = {}
+    for source in sources:
+        if source in failed:
+            continue
+        if source in results:
+            new_files[source] = {"hash": hashes[source], "output": get_output(source), "bytes": results[source][1]}
+        elif source in old_files:
+            new_files[source] = old_files[source]
+    os.makedirs(build_path, exist_ok=True)
+    with open(manifest_path, "w") as file:
+        json.dump({"version": PIPELINE_VERSION, "files": new_files, "bundles": new_bundles}, file, indent=1)
+
+    total_time = time.perf_counter() - start
+    with open(report_path, "w") as file:
+        file.write(f"{len(results)} built, {len(sources) - len(to_build)} up to date, {len(failed)} failed, {len(removed)} removed in {total_time:.2f}s\n")
+        file.write(f"Total output size: {sum(entry['bytes'] for entry in new_files.values())} bytes\n")
+        for name, bundle in new_bundles.items():
+            file.write(f"{name}: {bundle['bytes']} bytes{' (packed)' if name in packed else ''}\n")
+        file.write("\n")
+        for source, (seconds, size) in sorted(results.items(), key=lambda item: -item[1][0]):
+            file.write(f"{seconds * 1000:9.1f}ms {size:10d} bytes  {source}\n")
+        for source, error in failed.items():
+            file.write(f"   FAILED {source}: {error}\n")
+        for output in removed:
+            file.write(f"  REMOVED {output}\n")
+
+    print(f"{len(results)} built, {len(sources) - len(to_build)} up to date, {len(failed)} failed, {len(removed)} removed in {total_time:.2f}s; see {report_path}")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()